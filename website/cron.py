@@ -0,0 +1,18 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from website.models import SimulationFileUpload
+from website.utils.database_backup import backup
+
+
+def backup_django_database():
+    """
+    Back up the database, run by django-crontab (see CRONJOBS in settings.py).  Failures are logged by backup().
+    """
+    backup("cron", "cron")
+
+
+def delete_stale_uploads():
+    """
+    Delete abandoned chunked uploads and their partial files, run by django-crontab (see CRONJOBS in settings.py).
+    """
+    SimulationFileUpload.objects.delete_stale()
@@ -0,0 +1,186 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.template import Engine, RequestContext
+from django.test import RequestFactory
+from django.utils.timezone import now
+
+from website.middleware import LoginRequiredMiddleware
+from website.models import Folder, PARTIAL_INDEXES
+
+
+def measure(function, repeat):
+    """
+    Call function repeat times.
+
+    :return: Median and 95th percentile of the call time in milliseconds
+    """
+    timings = []
+    for i in range(repeat):
+        start_time = time.time()
+        function()
+        timings.append((time.time() - start_time) * 1000)
+
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+class Command(BaseCommand):
+    help = "Run performance benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=["list_queries", "middleware", "templates"], help="What to benchmark")
+
+        # Named (optional) arguments
+        parser.add_argument('--rows',
+            type=int,
+            dest='rows',
+            default=1000000,
+            help='Number of rows to seed for database benchmarks')
+        parser.add_argument('--repeat',
+            type=int,
+            dest='repeat',
+            default=100,
+            help='Number of times every measurement is repeated')
+
+    def handle(self, *args, **options):
+        """
+        Main function for the management command.
+        Benchmarks that need data seed it inside a transaction that is rolled back, so the database is left untouched.
+        """
+        getattr(self, "benchmark_%s" % options["target"])(options)
+
+    def report(self, name, timings):
+        self.stdout.write("%-50s median %8.3f ms, 95th percentile %8.3f ms" % ((name,) + timings))
+
+    def benchmark_list_queries(self, options):
+        """
+        Latency of typical folder list queries (which exclude deleted folders) with and without the partial indexes on
+        deletion_timestamp.
+        """
+        rows = options["rows"]
+        owner_count = 10
+
+        with transaction.atomic():
+            self.stdout.write("Seeding %s folders" % rows)
+            owners = [User.objects.create(username="benchmark-%s-%s" % (i, random.random())) for i in range(owner_count)]
+            first_id = (Folder.all_objects.aggregate(Max("id"))["id__max"] or 0) + 1
+            deletion_timestamp = now()
+            seed_start_time = time.time()
+            batch = []
+
+            for folder_id in range(first_id, first_id + rows):
+                # The first folders of every owner are top level folders, the rest is spread over earlier folders
+                is_top_level = folder_id - first_id < owner_count * 100
+                batch.append(Folder(
+                    id=folder_id,
+                    name="Folder %s" % folder_id,
+                    owner=owners[folder_id % owner_count],
+                    parent_folder_id=None if is_top_level else folder_id - owner_count * random.randint(1, 100),
+                    sort_order=folder_id,
+                    # One in ten folders is deleted
+                    deletion_timestamp=None if folder_id % 10 else deletion_timestamp,
+                ))
+                if len(batch) == 10000:
+                    Folder.all_objects.bulk_create(batch)
+                    batch = []
+            Folder.all_objects.bulk_create(batch)
+            self.stdout.write("Seeded in %.1f s" % (time.time() - seed_start_time))
+
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE folder")
+
+            some_folder_id = first_id + owner_count * 100
+            owner = owners[some_folder_id % owner_count]
+            queries = [
+                ("Top level folders of a user", lambda: list(
+                    Folder.objects.filter(owner=owner, parent_folder=None).order_by("sort_order")[:50]
+                )),
+                ("Subfolders of a folder", lambda: list(
+                    Folder.objects.filter(owner=owner, parent_folder_id=some_folder_id).order_by("sort_order")
+                )),
+                ("Number of folders of a user", lambda: Folder.objects.filter(owner=owner).count()),
+            ]
+
+            for name, query in queries:
+                self.report("%s (partial indexes)" % name, measure(query, options["repeat"]))
+
+            # Index changes are transactional, so the indexes come back when the transaction is rolled back
+            with connection.cursor() as cursor:
+                for index_name, table, columns in PARTIAL_INDEXES:
+                    cursor.execute("DROP INDEX IF EXISTS %s" % index_name)
+
+            for name, query in queries:
+                self.report("%s (no partial indexes)" % name, measure(query, options["repeat"]))
+
+            transaction.set_rollback(True)
+
+    def benchmark_middleware(self, options):
+        """
+        Per-request overhead of LoginRequiredMiddleware, measured over batches of 1000 requests.
+        """
+        middleware = LoginRequiredMiddleware()
+        request_factory = RequestFactory()
+
+        # Unsaved users don't have a team member, so nothing here touches the database
+        authenticated_request = request_factory.get("/")
+        authenticated_request.user = User(id=0, username="benchmark")
+        authenticated_request.session = {}
+        exempt_request = request_factory.get("/password_reset/")
+        exempt_request.user = AnonymousUser()
+        redirected_request = request_factory.get("/some/page/?page=2")
+        redirected_request.user = AnonymousUser()
+
+        for name, request in [
+            ("Authenticated user", authenticated_request),
+            ("Anonymous user, exempt URL", exempt_request),
+            ("Anonymous user, redirected to login", redirected_request),
+        ]:
+            self.report("%s (1000 requests)" % name, measure(
+                lambda: [middleware.process_request(request) for i in range(1000)], options["repeat"]
+            ))
+
+    def benchmark_templates(self, options):
+        """
+        Render time of index.html (which includes base.html and navbar.html) without and with the cached template loader
+        and template fragment caching.  Clears the template fragment cache.
+        """
+        template_settings = settings.TEMPLATES[0]
+        engine_options = {
+            "dirs": template_settings["DIRS"],
+            "context_processors": template_settings["OPTIONS"]["context_processors"],
+        }
+        loaders = ["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"]
+        uncached_engine = Engine(loaders=loaders, **engine_options)
+        cached_engine = Engine(loaders=[("django.template.loaders.cached.Loader", loaders)], **engine_options)
+
+        # Same cache as the {% cache %} tag uses
+        try:
+            fragment_cache = caches["template_fragments"]
+        except InvalidCacheBackendError:
+            fragment_cache = caches["default"]
+
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = {}
+
+        def render(engine, should_cache_fragments):
+            if not should_cache_fragments:
+                fragment_cache.clear()
+            engine.get_template("index.html").render(RequestContext(request))
+
+        fragment_cache.clear()
+        self.report("index.html (no caching)", measure(lambda: render(uncached_engine, False), options["repeat"]))
+        self.report("index.html (cached loader)", measure(lambda: render(cached_engine, False), options["repeat"]))
+        self.report("index.html (cached loader and fragments)", measure(
+            lambda: render(cached_engine, True), options["repeat"]
+        ))
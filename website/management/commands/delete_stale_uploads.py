@@ -0,0 +1,21 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from django.core.management.base import BaseCommand
+
+from website.models import SimulationFileUpload
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were abandoned, together with their partial files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, dest="days", default=None,
+                            help="Delete uploads that haven't received a chunk for this many days "
+                                 "(default: the CHUNKED_UPLOAD_EXPIRY_DAYS setting)")
+
+    def handle(self, *args, **options):
+        """
+        Main function for the management command.
+        """
+        deleted_count = SimulationFileUpload.objects.delete_stale(options["days"])
+        self.stdout.write("Deleted %s stale uploads" % deleted_count)
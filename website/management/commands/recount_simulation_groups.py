@@ -0,0 +1,26 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from django.core.management.base import BaseCommand
+
+from website.models import SimulationGroup, SimulationGroupStatusCount
+
+
+class Command(BaseCommand):
+    help = "Recompute the maintained status counts of simulation groups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("group_ids", nargs="*", type=int, help="Ids of the simulation groups, all groups if none")
+
+    def handle(self, *args, **options):
+        """
+        Main function for the management command.
+        Status counts are maintained transactionally, this repairs them if they were changed outside of the models
+        (raw SQL, restoring part of a backup and so on).
+        """
+        group_ids = options["group_ids"] or list(SimulationGroup.objects.order_by("id").values_list("id", flat=True))
+
+        # Keep the number of query parameters under SQLite's limit
+        for i in range(0, len(group_ids), 500):
+            SimulationGroupStatusCount.objects.recount(group_ids[i:i + 500])
+
+        self.stdout.write("Recounted %s simulation groups" % len(group_ids))
@@ -0,0 +1,48 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from website.models import SimulationGroup, SimulationGroupStatistics
+
+
+class Command(BaseCommand):
+    help = "Create or recompute execution statistics rollups of simulation groups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("group_ids", nargs="*", type=int, help="Ids of the simulation groups")
+
+        # Named (optional) arguments
+        parser.add_argument('--min-simulations',
+            type=int,
+            dest='min_simulations',
+            default=None,
+            help='Also roll up every group with at least this many simulations')
+        parser.add_argument('--existing',
+            action='store_true',
+            dest='existing',
+            default=False,
+            help='Recompute every existing rollup')
+
+    def handle(self, *args, **options):
+        """
+        Main function for the management command.
+        Rollups are maintained incrementally once they exist, recomputing them makes their min and max exact again.
+        """
+        group_ids = set(options["group_ids"])
+
+        if options["min_simulations"] is not None:
+            group_ids.update(
+                SimulationGroup.objects.annotate(simulation_count=Count("simulations")).filter(
+                    simulation_count__gte=options["min_simulations"]
+                ).values_list("id", flat=True)
+            )
+        if options["existing"]:
+            group_ids.update(SimulationGroupStatistics.objects.values_list("group_id", flat=True))
+
+        group_ids = sorted(group_ids)
+        # Keep the number of query parameters under SQLite's limit
+        for i in range(0, len(group_ids), 500):
+            SimulationGroupStatistics.objects.refresh(group_ids[i:i + 500])
+
+        self.stdout.write("Refreshed statistics of %s simulation groups" % len(group_ids))
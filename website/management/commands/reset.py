@@ -1,11 +1,17 @@
 # Copyright (C) 2015, University of Notre Dame
 # All rights reserved
 import os
-from django.core.management.base import BaseCommand
+import shutil
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.core.management import call_command
 from django.db import connection
 from django import db
 
+from website.utils.database_backup import backup
+from website.utils.fake_data import SIZE_PRESETS, populate
+
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -26,24 +32,107 @@ class Command(BaseCommand):
             dest='nomigrate',
             default=False,
             help='Do not run migrate command')
+        parser.add_argument('--size',
+            choices=sorted(SIZE_PRESETS),
+            dest='size',
+            default='small',
+            help='Amount of fake data to load (default: small)')
+        parser.add_argument('--seed',
+            type=int,
+            dest='seed',
+            default=0,
+            help='Seed of the fake data generator, the same seed always generates the same data')
+        parser.add_argument('--snapshot',
+            dest='snapshot',
+            default=None,
+            help='After migrating and loading fake data, save the database as a snapshot with this name')
+        parser.add_argument('--restore',
+            dest='restore',
+            default=None,
+            help='Restore the snapshot with this name instead of migrating and loading fake data')
 
     def handle(self, *args, **options):
         """
         Main function for the management command.
         Drop all tables, run migrate command and populate database with fake data
+
+        Dropping is done wholesale: the SQLite database file is deleted, the PostgreSQL public schema is dropped and
+        created again.  Restoring a snapshot (a copy of the SQLite file, or a PostgreSQL template database) skips
+        migrating and loading data altogether, so a reset takes seconds.  Snapshots only hold the database; simulation
+        files stay in storage across resets anyway.
         """
         engine = db.connections.databases['default']['ENGINE']
-        cursor = connection.cursor()
+        if engine == "django.db.backends.sqlite3":
+            vendor = "sqlite"
+        elif engine == "django.db.backends.postgresql_psycopg2" or engine == "django.db.backends.postgresql":
+            vendor = "postgresql"
+        else:
+            raise RuntimeError("Unsupported database engine %s" % engine)
+
+        if options["restore"] and not self.snapshot_exists(vendor, options["restore"]):
+            raise CommandError("There is no snapshot %s" % options["restore"])
+
+        start_time = time.time()
 
         if not options["nobackup"]:
-            print "Database backup has not been impelemented yet - skipping"
-            # result, message = backup("reset", os.environ.get("USER", "unknown"))
-            # if not result:
-            #     print "Failed to backup the database, %s" % message
-            #     return
-            # print "Backup complete, filename %s" % message
-        print "Dropping all tables"
-        if engine == "django.db.backends.sqlite3":
+            self.stdout.write("Backing up the database")
+            result, message = backup("reset", os.environ.get("USER", "unknown"))
+            if not result:
+                self.stdout.write("Failed to backup the database, %s" % message)
+                return
+            self.stdout.write("Backup complete, %s" % message)
+
+        if options["restore"]:
+            self.stdout.write("Restoring snapshot %s" % options["restore"])
+            getattr(self, "restore_%s_snapshot" % vendor)(options["restore"])
+        else:
+            self.stdout.write("Dropping all tables")
+            getattr(self, "drop_%s_tables" % vendor)()
+
+            if not options["nomigrate"]:
+                self.stdout.write("Running migrate command")
+                call_command("migrate")
+
+                if not options['nodata']:
+                    self.stdout.write("Populating database with %s fake data" % options["size"])
+                    populate(options["size"], options["seed"], log=self.stdout.write)
+
+            if options["snapshot"]:
+                self.stdout.write("Saving snapshot %s" % options["snapshot"])
+                getattr(self, "save_%s_snapshot" % vendor)(options["snapshot"])
+
+        self.stdout.write("Reset done in %.1f s" % (time.time() - start_time))
+
+    @staticmethod
+    def get_sqlite_path():
+        name = db.connections.databases['default']['NAME']
+        # In-memory databases have no file
+        if name == ":memory:" or name.startswith("file:"):
+            return None
+        return name
+
+    @staticmethod
+    def get_sqlite_snapshot_path(name):
+        return os.path.join(settings.DATABASE_MANAGER_DIR, "snapshots", "%s.sqlite3" % name)
+
+    @staticmethod
+    def get_postgresql_snapshot_database(name):
+        return "%s_snapshot_%s" % (db.connections.databases['default']['NAME'], name)
+
+    def snapshot_exists(self, vendor, name):
+        if vendor == "sqlite":
+            return os.path.exists(self.get_sqlite_snapshot_path(name))
+
+        with connection._nodb_connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_database WHERE datname = %s", [self.get_postgresql_snapshot_database(name)]
+            )
+            return cursor.fetchone() is not None
+
+    def drop_sqlite_tables(self):
+        path = self.get_sqlite_path()
+        if path is None:
+            cursor = connection.cursor()
             # List of all tables in SQLite database
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
             tables = [row[0] for row in cursor.fetchall()]
@@ -51,23 +140,59 @@ class Command(BaseCommand):
                 if table != "sqlite_sequence":
                     # table sqlite_sequence may not be dropped
                     cursor.execute("DROP TABLE '%s'" % table)
-        elif engine == "django.db.backends.postgresql_psycopg2" or engine == "django.db.backends.postgresql":
-            # List of all tables in PostgreSQL database
-            # http://dba.stackexchange.com/questions/1285/how-do-i-list-all-databases-and-tables-using-psql
-            # Note you can't drop database here - because connection.cursor() is using it!
-            # Thus deleting all tables and re-creating them using migrate command later
-            cursor.execute("SELECT table_schema,table_name FROM information_schema.tables ORDER BY table_schema, table_name;")  # noqa
-            tables = cursor.fetchall()
-            for table in tables:
-                if table[0] == "public":
-                    cursor.execute("DROP TABLE %s.%s CASCADE;" % (table[0], table[1]))
-        else:
-            raise RuntimeError("Unsupported database engine %s" % engine)
+            return
+
+        # Much faster than dropping table by table; the next query creates an empty database file
+        connection.close()
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def drop_postgresql_tables(self):
+        # Note you can't drop database here - because connection.cursor() is using it!
+        # Dropping the schema drops everything in it (tables, sequences, indexes) in one statement
+        with connection.cursor() as cursor:
+            cursor.execute("DROP SCHEMA public CASCADE")
+            cursor.execute("CREATE SCHEMA public")
+            cursor.execute("GRANT ALL ON SCHEMA public TO public")
+
+    def save_sqlite_snapshot(self, name):
+        path = self.get_sqlite_path()
+        if path is None:
+            raise CommandError("In-memory databases can't be saved as a snapshot")
+
+        snapshot_path = self.get_sqlite_snapshot_path(name)
+        if not os.path.exists(os.path.dirname(snapshot_path)):
+            os.makedirs(os.path.dirname(snapshot_path))
+        # Nothing else is using the database during a reset, so copying the file is enough
+        connection.close()
+        shutil.copyfile(path, snapshot_path)
+
+    def restore_sqlite_snapshot(self, name):
+        path = self.get_sqlite_path()
+        if path is None:
+            raise CommandError("Snapshots can't be restored into in-memory databases")
+
+        self.drop_sqlite_tables()
+        # Copy to a temporary file first so an interruption never leaves a partial database behind
+        shutil.copyfile(self.get_sqlite_snapshot_path(name), path + ".restore")
+        os.rename(path + ".restore", path)
 
-        if not options["nomigrate"]:
-            print "Running migrate command"
-            call_command("migrate")
+    def save_postgresql_snapshot(self, name):
+        # A database can only be used as a template while nobody is connected to it, so this connects to the
+        # maintenance database instead
+        snapshot_database = connection.ops.quote_name(self.get_postgresql_snapshot_database(name))
+        database = connection.ops.quote_name(db.connections.databases['default']['NAME'])
+        connection.close()
+        with connection._nodb_connection.cursor() as cursor:
+            cursor.execute("DROP DATABASE IF EXISTS %s" % snapshot_database)
+            cursor.execute("CREATE DATABASE %s TEMPLATE %s" % (snapshot_database, database))
 
-            if not options['nodata']:
-                print "Populating database with fake data is not implemented yet, skipping"
-                # create_specs_and_files(None)
+    def restore_postgresql_snapshot(self, name):
+        # Copying a template database is a file level copy, much faster than replaying migrations and inserts
+        snapshot_database = connection.ops.quote_name(self.get_postgresql_snapshot_database(name))
+        database = connection.ops.quote_name(db.connections.databases['default']['NAME'])
+        connection.close()
+        with connection._nodb_connection.cursor() as cursor:
+            cursor.execute("DROP DATABASE %s" % database)
+            cursor.execute("CREATE DATABASE %s TEMPLATE %s" % (database, snapshot_database))
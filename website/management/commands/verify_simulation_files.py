@@ -0,0 +1,176 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+import json
+import multiprocessing
+import os
+import time
+
+from django import db
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+
+from website.models import SimulationInputFile, SimulationOutputFile
+from website.utils.md5_and_file_size import get_md5_and_file_size
+
+MEGABYTE = 1024.0 * 1024.0
+
+
+def hash_stored_file(name):
+    """
+    Compute md5 and size of a file in the default storage.  Runs in a worker process, so it must not touch the
+    database.
+
+    :return: name, md5, size and error message (md5 and size are None if the file couldn't be read)
+    """
+    try:
+        with default_storage.open(name, "rb") as stored_file:
+            md5, size = get_md5_and_file_size(data_source=stored_file)
+    except (IOError, OSError) as e:
+        return name, None, None, str(e)
+
+    return name, md5, size, None
+
+
+class Command(BaseCommand):
+    help = "Verify that md5 and size of every stored simulation file still match its contents"
+
+    def add_arguments(self, parser):
+
+        # Named (optional) arguments
+        parser.add_argument('--processes',
+            type=int,
+            dest='processes',
+            default=multiprocessing.cpu_count(),
+            help='Number of processes hashing files (default: number of CPUs)')
+        parser.add_argument('--batch-size',
+            type=int,
+            dest='batch_size',
+            default=1000,
+            help='Number of file rows loaded from the database at a time')
+        parser.add_argument('--since',
+            dest='since',
+            default=None,
+            help='Only verify files created (input files) or produced (output files) on or after this date/time')
+        parser.add_argument('--state-file',
+            dest='state_file',
+            default=os.path.join(settings.DATABASE_MANAGER_DIR, "verify_simulation_files.json"),
+            help='File recording progress, used to resume an interrupted run')
+        parser.add_argument('--restart',
+            action='store_true',
+            dest='restart',
+            default=False,
+            help='Ignore progress recorded by an earlier run and start from the beginning')
+
+    def handle(self, *args, **options):
+        """
+        Main function for the management command.
+        Hash all stored simulation files across a process pool and report files whose md5 or size don't match.
+        """
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"]) or parse_date(options["since"])
+            if since is None:
+                raise CommandError("Invalid --since value %s" % options["since"])
+
+        self.state_file = options["state_file"]
+        self.state = {"since": options["since"]}
+        if not options["restart"] and os.path.exists(self.state_file):
+            with open(self.state_file) as state_file:
+                state = json.load(state_file)
+            # Progress made with a different --since filter doesn't apply to this run
+            if state.get("since") == options["since"]:
+                self.state = state
+                self.stdout.write("Resuming from %s" % self.state_file)
+
+        querysets = [
+            ("input", SimulationInputFile.objects.all()),
+            ("output", SimulationOutputFile.objects.all()),
+        ]
+        if since is not None:
+            querysets = [
+                ("input", querysets[0][1].filter(created_when__gte=since)),
+                # Output files have no timestamp of their own, they are produced when the simulation finishes
+                ("output", querysets[1][1].filter(simulation__execution_end_timestamp__gte=since)),
+            ]
+
+        # Worker processes are forked, so they must not inherit open database connections
+        db.connections.close_all()
+        pool = multiprocessing.Pool(options["processes"])
+        mismatches = 0
+
+        try:
+            for file_type, queryset in querysets:
+                mismatches += self.verify(file_type, queryset, pool, options["batch_size"])
+        finally:
+            pool.terminate()
+            pool.join()
+
+        # Everything has been verified, the next run starts from the beginning
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+        if mismatches:
+            raise CommandError("%s simulation files do not match their md5 or size" % mismatches)
+        self.stdout.write("All simulation files match their md5 and size")
+
+    def verify(self, file_type, queryset, pool, batch_size):
+        """
+        Verify all files in queryset, batch by batch in order of id.
+
+        :return: Number of files that don't match
+        """
+        last_id = self.state.get(file_type, 0)
+        total = queryset.count()
+        checked = queryset.filter(id__lte=last_id).count()
+        # Mismatches found before an interruption are still reported at the end
+        mismatches = self.state.get("%s_mismatches" % file_type, 0)
+        bytes_hashed = 0
+        start_time = time.time()
+
+        while True:
+            # Keyset pagination keeps every batch query cheap, no matter how far into the table it is
+            rows = list(queryset.filter(id__gt=last_id).order_by("id").values_list("id", "file", "md5", "size")[:batch_size])
+            if not rows:
+                break
+
+            # Copies of a simulation file share the same stored file, so each file only needs to be hashed once
+            names = set(row[1] for row in rows)
+            results = dict((result[0], result[1:]) for result in pool.imap_unordered(hash_stored_file, names))
+
+            for file_id, name, md5, size in rows:
+                actual_md5, actual_size, error = results[name]
+                if error:
+                    mismatches += 1
+                    self.stderr.write("%s file %s (%s): %s" % (file_type, file_id, name, error))
+                elif actual_md5 != md5 or actual_size != size:
+                    mismatches += 1
+                    self.stderr.write("%s file %s (%s): expected md5 %s and size %s, got md5 %s and size %s" % (
+                        file_type, file_id, name, md5, size, actual_md5, actual_size
+                    ))
+
+            bytes_hashed += sum(results[name][1] or 0 for name in names)
+            checked += len(rows)
+            last_id = rows[-1][0]
+            self.save_state(file_type, last_id, mismatches)
+
+            elapsed = time.time() - start_time
+            self.stdout.write("%s files: %s/%s checked, %s mismatches, %.1f MB/s" % (
+                file_type, checked, total, mismatches, bytes_hashed / MEGABYTE / elapsed if elapsed else 0
+            ))
+
+        return mismatches
+
+    def save_state(self, file_type, last_id, mismatches):
+        self.state[file_type] = last_id
+        self.state["%s_mismatches" % file_type] = mismatches
+
+        state_directory = os.path.dirname(self.state_file)
+        if state_directory and not os.path.exists(state_directory):
+            os.makedirs(state_directory)
+
+        # Write to a temporary file first so an interruption never leaves a truncated state file behind
+        with open(self.state_file + ".tmp", "w") as state_file:
+            json.dump(self.state, state_file)
+        os.rename(self.state_file + ".tmp", self.state_file)
@@ -1,11 +1,20 @@
 # Copyright (C) 2015, University of Notre Dame
 # All rights reserved
 from django.core.urlresolvers import reverse
+from django.db import connections
 from django.http.response import HttpResponseRedirect
+from django.template.base import Template
 from django.conf import settings
 from re import compile
+import logging
+import threading
+import time
 import urllib
 
+from website.utils.request_statistics import request_statistics
+
+logger = logging.getLogger(__name__)
+
 class HttpRedirectException(Exception):
     def __init__(self, url, message=""):
         super(self.__class__, self).__init__()
@@ -22,12 +31,114 @@ class RedirectionMiddleware(object):
         return None
 
 
-EXEMPT_URLS = [compile(settings.LOGIN_URL.lstrip('/'))]
-if hasattr(settings, 'LOGIN_EXEMPT_URLS'):
-    if isinstance(settings.LOGIN_EXEMPT_URLS, (str,unicode)):
-        EXEMPT_URLS.append(compile(settings.LOGIN_EXEMPT_URLS))
-    else:
-        EXEMPT_URLS += [compile(expr) for expr in settings.LOGIN_EXEMPT_URLS]
+# Requests slower than this many milliseconds are logged with their slowest queries
+SLOW_REQUEST_THRESHOLD = getattr(settings, "SLOW_REQUEST_THRESHOLD", 1000)
+SLOW_REQUEST_QUERY_COUNT = 5
+
+# Template render time of the request being handled by the current thread
+_render_timing = threading.local()
+_original_template_render = Template.render
+
+
+def timed_template_render(self, context):
+    """
+    Replacement of Template.render adding the render time to the current request.  Templates included by other
+    templates are rendered within them, so only the outermost render is timed.
+    """
+    if getattr(_render_timing, "depth", None) is None:
+        # Not in an instrumented request
+        return _original_template_render(self, context)
+
+    _render_timing.depth += 1
+    start_time = time.time()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        _render_timing.depth -= 1
+        if not _render_timing.depth:
+            _render_timing.total += time.time() - start_time
+
+
+class PerformanceMiddleware(object):
+    """
+    Record wall time, number and time of database queries, template render time and response size of every request,
+    and keep rolling percentiles of them per URL name (see website.utils.request_statistics).  Requests slower than
+    SLOW_REQUEST_THRESHOLD are logged with their slowest queries.  Works without DEBUG, so N+1 queries and other hot
+    spots can be found in production.
+
+    Should be the first middleware, so it measures all the others too.
+    """
+    def __init__(self):
+        Template.render = timed_template_render
+
+    def process_request(self, request):
+        request._performance_start_time = time.time()
+        request._performance_query_log_lengths = {}
+        for connection in connections.all():
+            # Queries are only logged without DEBUG if the cursor is forced to be a debug cursor
+            request._performance_query_log_lengths[connection.alias] = (
+                connection.force_debug_cursor, len(connection.queries_log)
+            )
+            connection.force_debug_cursor = True
+        _render_timing.depth = 0
+        _render_timing.total = 0.0
+
+    def process_response(self, request, response):
+        if not hasattr(request, "_performance_start_time"):
+            # An earlier middleware returned a response before process_request was called
+            return response
+
+        wall_time = (time.time() - request._performance_start_time) * 1000
+        render_time = _render_timing.total * 1000
+        _render_timing.depth = None
+
+        queries = []
+        for alias, (force_debug_cursor, query_log_length) in request._performance_query_log_lengths.items():
+            connection = connections[alias]
+            connection.force_debug_cursor = force_debug_cursor
+            # The log is a bounded deque, requests with more queries than it holds only count the ones it kept
+            queries += list(connection.queries_log)[query_log_length:]
+        query_time = sum(float(query["time"]) for query in queries) * 1000
+
+        resolver_match = getattr(request, "resolver_match", None)
+        url_name = resolver_match.url_name if resolver_match and resolver_match.url_name else "<unnamed>"
+        response_size = None if response.streaming else len(response.content)
+
+        request_statistics.record(
+            url_name, wall_time=wall_time, query_count=len(queries), query_time=query_time, render_time=render_time,
+            response_size=response_size,
+        )
+
+        if wall_time > SLOW_REQUEST_THRESHOLD:
+            slowest_queries = sorted(queries, key=lambda query: float(query["time"]), reverse=True)
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %s queries in %.0f ms, rendering %.0f ms\n%s",
+                request.method, request.path, url_name, wall_time, len(queries), query_time, render_time,
+                "\n".join("%s ms: %s" % (float(query["time"]) * 1000, query["sql"])
+                          for query in slowest_queries[:SLOW_REQUEST_QUERY_COUNT])
+            )
+
+        return response
+
+
+def get_exempt_url_pattern():
+    """
+    Combine LOGIN_URL and the LOGIN_EXEMPT_URLS regular expressions into one, so a path is matched against all of
+    them at once.
+    """
+    expressions = [settings.LOGIN_URL.lstrip('/')]
+    if hasattr(settings, 'LOGIN_EXEMPT_URLS'):
+        if isinstance(settings.LOGIN_EXEMPT_URLS, (str,unicode)):
+            expressions.append(settings.LOGIN_EXEMPT_URLS)
+        else:
+            expressions += settings.LOGIN_EXEMPT_URLS
+    return compile("|".join("(?:%s)" % expression for expression in expressions))
+
+
+EXEMPT_URL_PATTERN = get_exempt_url_pattern()
+
+# Session key remembering that the logged in user doesn't have to change a generated password
+PASSWORD_CHECKED_SESSION_KEY = "login_required_password_checked"
 
 
 class LoginRequiredMiddleware:
@@ -44,14 +155,17 @@ class LoginRequiredMiddleware:
     http://stackoverflow.com/questions/3214589/django-how-can-i-apply-the-login-required-decorator-to-my-entire-site-excludin
     """
     def process_request(self, request):
-        redirect_url = settings.LOGIN_URL + '?next=%s' % urllib.quote(request.build_absolute_uri())
         is_authenticated = request.user.is_authenticated() if hasattr(request, "user") else False
 
         if not is_authenticated:
-            path = request.path_info.lstrip('/')
-            if not any(m.match(path) for m in EXEMPT_URLS):
+            if not EXEMPT_URL_PATTERN.match(request.path_info.lstrip('/')):
+                redirect_url = settings.LOGIN_URL + '?next=%s' % urllib.quote(request.build_absolute_uri())
                 return HttpResponseRedirect(redirect_url)
-        elif hasattr(request.user, "teammember"):
-            if request.user.teammember.generated_password:
+        elif request.session.get(PASSWORD_CHECKED_SESSION_KEY) != request.user.pk:
+            # Looking up the team member costs a query, so it is only done until the user no longer has a generated
+            # password.  A password is only ever generated for a new user, so that never changes back.
+            if hasattr(request.user, "teammember") and request.user.teammember.generated_password:
                 if not "auth" in request.path_info.lstrip('/'):
                     return HttpResponseRedirect(reverse("password_change"))
+            else:
+                request.session[PASSWORD_CHECKED_SESSION_KEY] = request.user.pk
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 20:21
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Baseline',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('creation_timestamp', models.DateTimeField(auto_now_add=True)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+                ('deletion_timestamp', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'baseline',
+                'verbose_name': 'Baseline',
+                'verbose_name_plural': 'Baselines',
+            },
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Folder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('sort_order', models.IntegerField()),
+                ('creation_timestamp', models.DateTimeField(auto_now_add=True)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+                ('deletion_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('parent_folder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.Folder')),
+            ],
+            options={
+                'db_table': 'folder',
+                'verbose_name': 'Folder',
+                'verbose_name_plural': 'Folders',
+            },
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('latitude', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('longitude', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('grid_cell', models.IntegerField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'db_table': 'location',
+                'verbose_name': 'Location',
+                'verbose_name_plural': 'Locations',
+            },
+        ),
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.TextField(default=None)),
+            ],
+            options={
+                'db_table': 'model_version',
+                'verbose_name': 'ModelVersion',
+                'verbose_name_plural': 'ModelVersions',
+            },
+        ),
+        migrations.CreateModel(
+            name='Simulation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command_line_arguments', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(default=b'ready', max_length=7)),
+                ('creation_timestamp', models.DateTimeField(auto_now_add=True)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+                ('execution_start_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('execution_end_timestamp', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'simulation',
+                'verbose_name': 'Simulation',
+                'verbose_name_plural': 'Simulations',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationFileBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('md5', models.CharField(max_length=32, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('file', models.FileField(max_length=255, upload_to=b'')),
+                ('reference_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'simulation_file_blob',
+                'verbose_name': 'SimulationFileBlob',
+                'verbose_name_plural': 'SimulationFileBlobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationFileUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('size', models.BigIntegerField()),
+                ('chunk_size', models.IntegerField()),
+                ('received_chunks', jsonfield.fields.JSONField(default=list)),
+                ('hashed_size', models.BigIntegerField(default=0)),
+                ('creation_timestamp', models.DateTimeField(auto_now_add=True)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'simulation_file_upload',
+                'verbose_name': 'SimulationFileUpload',
+                'verbose_name_plural': 'SimulationFileUploads',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationGroup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_timestamp', models.DateTimeField(auto_now_add=True)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+                ('submission_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('start_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('submitted_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'simulation_group',
+                'verbose_name': 'SimulationGroup',
+                'verbose_name_plural': 'SimulationGroup',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationGroupStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration_count', models.BigIntegerField(default=0)),
+                ('duration_sum', models.FloatField(default=0)),
+                ('duration_min', models.FloatField(blank=True, null=True)),
+                ('duration_max', models.FloatField(blank=True, null=True)),
+                ('duration_histogram', jsonfield.fields.JSONField(default=dict)),
+                ('last_modified_timestamp', models.DateTimeField(auto_now=True)),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='website.SimulationGroup')),
+            ],
+            options={
+                'db_table': 'simulation_group_statistics',
+                'verbose_name': 'SimulationGroupStatistics',
+                'verbose_name_plural': 'SimulationGroupStatistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationGroupStatusCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.TextField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counts', to='website.SimulationGroup')),
+            ],
+            options={
+                'db_table': 'simulation_group_status_count',
+                'verbose_name': 'SimulationGroupStatusCount',
+                'verbose_name_plural': 'SimulationGroupStatusCounts',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationInputFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(default=None)),
+                ('file', models.FileField(default=None, upload_to=b'')),
+                ('md5', models.TextField(default=None)),
+                ('size', models.BigIntegerField()),
+                ('created_when', models.DateTimeField(auto_now_add=True, help_text=b'when was the file created')),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.SimulationFileBlob')),
+                ('created_by', models.ForeignKey(help_text=b'who created the file', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('simulations', models.ManyToManyField(help_text=b'the simulations that used this file as input', related_name='input_files', to='website.Simulation')),
+            ],
+            options={
+                'db_table': 'simulation_input_file',
+                'verbose_name': 'SimulationInputFile',
+                'verbose_name_plural': 'SimulationInputFiles',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimulationOutputFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(default=None)),
+                ('file', models.FileField(default=None, upload_to=b'')),
+                ('md5', models.TextField(default=None)),
+                ('size', models.BigIntegerField()),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.SimulationFileBlob')),
+                ('simulation', models.ForeignKey(blank=True, help_text=b'the simulation that produced this file', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='output_files', to='website.Simulation')),
+            ],
+            options={
+                'db_table': 'simulation_output_file',
+                'verbose_name': 'SimulationOutputFile',
+                'verbose_name_plural': 'SimulationOutputFiles',
+            },
+        ),
+        migrations.AddField(
+            model_name='simulationfileupload',
+            name='simulation_file',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='website.SimulationInputFile'),
+        ),
+        migrations.AddField(
+            model_name='simulationfileupload',
+            name='uploaded_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simulations', to='website.SimulationGroup'),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='version',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.ModelVersion'),
+        ),
+        migrations.AddField(
+            model_name='baseline',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.Location'),
+        ),
+        migrations.AddField(
+            model_name='baseline',
+            name='simulation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='website.Simulation'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='simulationgroupstatuscount',
+            unique_together=set([('group', 'status')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='folder',
+            index_together=set([('owner', 'parent_folder', 'deletion_timestamp')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='baseline',
+            index_together=set([('simulation', 'deletion_timestamp'), ('location', 'deletion_timestamp')]),
+        ),
+    ]
@@ -1,17 +1,40 @@
+import hashlib
+import math
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from operator import attrgetter
+from uuid import uuid4
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, connections, models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.signals import post_delete, post_migrate
+from django.utils import six
 from django.utils.timezone import now
 
 from jsonfield import JSONField
-from vecnet.simulation import sim_model, sim_status
-from website.utils.md5_and_file_size import get_md5_and_file_size
+from vecnet.simulation import sim_status
+from website.utils.change_feed import simulation_group_changes
+from website.utils.grid_cells import EARTH_RADIUS, get_bounding_box, get_distance, get_grid_cell, \
+    get_grid_cell_ranges
+from website.utils.md5_and_file_size import Md5AndFileSizeReader, get_chunk_size
 
 
 class RemoveDeletedManager(models.Manager):
     def get_queryset(self):
         # Not exactly sure why PyCharm code inspector does not like 'super' below
         # Code is based on https://docs.djangoproject.com/en/1.8/topics/db/managers/
-        return super(RemoveDeletedManager, self).get_queryset().filter(deletion_timestamp__isnull=False).exclude(deletion_timestamp="")
+        # Filtering on IS NULL alone lets the database use the partial indexes created by create_partial_indexes below
+        return super(RemoveDeletedManager, self).get_queryset().filter(deletion_timestamp__isnull=True)
 
 
 class ModelVersion(models.Model):
@@ -23,6 +46,80 @@ class ModelVersion(models.Model):
         verbose_name_plural = "ModelVersions"
 
 
+# Set while simulations are deleted in bulk, see deleting_simulations_in_bulk()
+_simulation_deletes = threading.local()
+
+
+@contextmanager
+def deleting_simulations_in_bulk():
+    """
+    Within the block, deleted simulations are not removed from their group's status counts and statistics one by one
+    (see uncount_deleted_simulation).  Whoever deletes them updates those for all of them at once, or deletes the
+    groups along with them.
+    """
+    previous = getattr(_simulation_deletes, "in_bulk", False)
+    _simulation_deletes.in_bulk = True
+    try:
+        yield
+    finally:
+        _simulation_deletes.in_bulk = previous
+
+
+class SimulationGroupQuerySet(models.QuerySet):
+    def delete(self):
+        # The groups' status counts and statistics are deleted with them, so their simulations don't update them
+        with deleting_simulations_in_bulk():
+            return super(SimulationGroupQuerySet, self).delete()
+
+
+class SimulationGroupManager(models.Manager):
+    """
+    Custom model manager for simulation groups.
+    """
+
+    def get_queryset(self):
+        return SimulationGroupQuerySet(self.model, using=self._db)
+
+    def submit(self, submitted_by, simulation_specs, input_files=()):
+        """
+        Create a SimulationGroup together with all of its simulations and their input files in one transaction, using
+        bulk inserts.  Meant for parameter sweeps with thousands of simulations.
+
+        :param submitted_by: User submitting the simulations
+        :param simulation_specs: Iterable of dictionaries, one per simulation, with the keys "version" (ModelVersion or
+        its id), "command_line_arguments" (optional) and "input_files" (optional, SimulationInputFiles or their ids
+        used by this simulation only)
+        :param input_files: SimulationInputFiles (or their ids) used by every simulation in the group
+        :return: The new SimulationGroup
+        """
+        simulation_specs = list(simulation_specs)
+        shared_input_file_ids = [getattr(input_file, "pk", input_file) for input_file in input_files]
+
+        with transaction.atomic():
+            # Nothing is visible to other connections until everything is in, so the group appears submitted with
+            # all of its simulations at once
+            simulation_group = self.create(submitted_by=submitted_by, submission_timestamp=now())
+            simulations = Simulation.objects._bulk_create_in_group(simulation_group, [
+                Simulation(
+                    group=simulation_group,
+                    version_id=getattr(spec["version"], "pk", spec["version"]),
+                    command_line_arguments=spec.get("command_line_arguments"),
+                    status=sim_status.READY_TO_RUN
+                )
+                for spec in simulation_specs
+            ])
+
+            links = []
+            for simulation, spec in zip(simulations, simulation_specs):
+                links.extend((simulation.id, input_file_id) for input_file_id in shared_input_file_ids)
+                links.extend(
+                    (simulation.id, getattr(input_file, "pk", input_file)) for input_file in spec.get("input_files", ())
+                )
+            Simulation.objects._bulk_add_input_files(links)
+
+        return simulation_group
+
+
 class SimulationGroup(models.Model):
     """
     Represents a group of simulations submitted for execution at the same time.
@@ -34,6 +131,39 @@ class SimulationGroup(models.Model):
     submission_timestamp = models.DateTimeField(null=True, blank=True)
     start_timestamp = models.DateTimeField(null=True, blank=True)
 
+    objects = SimulationGroupManager()
+
+    def delete(self, *args, **kwargs):
+        # Its status counts and statistics are deleted with it, so its simulations don't update them
+        with deleting_simulations_in_bulk():
+            return super(SimulationGroup, self).delete(*args, **kwargs)
+
+    def get_status_counts(self):
+        """
+        Number of the group's simulations in every status, read from the maintained counts (a single small query).
+
+        :return: Dictionary of status -> number of simulations
+        """
+        return dict(self.status_counts.filter(count__gt=0).values_list("status", "count"))
+
+    def get_progress(self):
+        """
+        :return: Number of complete simulations and total number of simulations in the group
+        """
+        status_counts = self.get_status_counts()
+        return status_counts.get(sim_status.SCRIPT_DONE, 0), sum(status_counts.values())
+
+    def get_execution_statistics(self):
+        """
+        Execution duration statistics of the group's simulations (see SimulationManager.get_execution_statistics).
+        Uses the group's SimulationGroupStatistics if it has one, which is much faster for very large groups (but its
+        percentiles are estimates).
+        """
+        try:
+            return self.statistics.as_dict()
+        except SimulationGroupStatistics.DoesNotExist:
+            return Simulation.objects.get_execution_statistics("group", [self.id]).get(self.id)
+
     def __str__(self):
         return "%s" % self.id
 
@@ -43,6 +173,307 @@ class SimulationGroup(models.Model):
         verbose_name_plural = "SimulationGroup"
 
 
+# Fields of a simulation that are updated by the cluster through SimulationManager.apply_status_updates
+STATUS_UPDATE_FIELDS = ("status", "execution_start_timestamp", "execution_end_timestamp")
+# Simulations per UPDATE, keeps the number of query parameters (up to 7 per simulation) under SQLite's limit of 999
+STATUS_UPDATE_BATCH_SIZE = 100
+
+
+# Percentiles of the execution duration reported by execution statistics
+DURATION_PERCENTILES = (50, 90, 95, 99)
+
+
+def get_duration(simulation_values):
+    """
+    Execution duration in seconds from a dictionary with a simulation's execution timestamps, None if unfinished.
+    """
+    start, end = simulation_values["execution_start_timestamp"], simulation_values["execution_end_timestamp"]
+    if start is None or end is None:
+        return None
+
+    return (end - start).total_seconds()
+
+
+class SimulationQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Delete the simulations and update the status counts and statistics of their groups with a few queries per
+        group, instead of a few per simulation.
+        """
+        with transaction.atomic(), deleting_simulations_in_bulk():
+            # Locked, so nothing changes between counting the simulations and deleting them
+            list(self.select_for_update().values_list("id", flat=True))
+
+            status_count_changes = defaultdict(int)
+            for group_id, status, count in self.order_by().values_list("group_id", "status").annotate(Count("id")):
+                status_count_changes[(group_id, status)] -= count
+            duration_changes = defaultdict(list)
+            for values in self.filter(
+                group__statistics__isnull=False, execution_start_timestamp__isnull=False,
+                execution_end_timestamp__isnull=False
+            ).values("group_id", "execution_start_timestamp", "execution_end_timestamp"):
+                duration_changes[values["group_id"]].append((get_duration(values), None))
+
+            result = super(SimulationQuerySet, self).delete()
+            SimulationGroupStatusCount.objects.apply_changes(status_count_changes)
+            SimulationGroupStatistics.objects.apply_duration_changes(duration_changes)
+
+        return result
+
+
+class SimulationManager(models.Manager):
+    """
+    Custom model manager for simulations.
+    """
+
+    def get_queryset(self):
+        return SimulationQuerySet(self.model, using=self._db)
+
+    def copy_simulations(self, simulations, submitted_by, should_include_output=False):
+        """
+        Copy simulations into a single new SimulationGroup.  The copies use the same input files as the originals and,
+        if should_include_output is True, share the originals' output file contents through the blob store.
+
+        Uses the same number of queries no matter how many simulations are copied (apart from the database backend
+        splitting very large bulk inserts into batches).
+
+        :param simulations: QuerySet of the simulations to copy
+        :param submitted_by: User the new SimulationGroup is submitted by
+        :return: List of the new simulations, in the order of the ids of the simulations they were copied from
+        """
+        sources = list(simulations.order_by("id").values_list("id", "version_id", "command_line_arguments"))
+
+        with transaction.atomic():
+            simulation_group = SimulationGroup.objects.create(submitted_by=submitted_by)
+            new_simulations = self._bulk_create_in_group(simulation_group, [
+                Simulation(
+                    group=simulation_group,
+                    version_id=version_id,
+                    command_line_arguments=command_line_arguments,
+                    status=sim_status.READY_TO_RUN
+                )
+                for simulation_id, version_id, command_line_arguments in sources
+            ])
+            new_simulation_ids = dict(
+                (source[0], new_simulation.id) for source, new_simulation in zip(sources, new_simulations)
+            )
+
+            # Add simulation input files to the new simulations
+            self._bulk_add_input_files([
+                (new_simulation_ids[simulation_id], input_file_id)
+                for simulation_id, input_file_id in SimulationInputFile.simulations.through.objects.filter(
+                    simulation__in=simulations
+                ).values_list("simulation_id", "simulationinputfile_id")
+            ])
+
+            if should_include_output:
+                # Add simulation output files to the new simulations.  Copies share the originals' blobs, so only the
+                # blobs' reference counts change.
+                output_files = list(SimulationOutputFile.objects.filter(simulation__in=simulations))
+                blob_references = defaultdict(int)
+
+                for output_file in output_files:
+                    output_file.pk = None
+                    output_file.simulation_id = new_simulation_ids[output_file.simulation_id]
+                    if output_file.blob_id is not None:
+                        blob_references[output_file.blob_id] += 1
+
+                SimulationOutputFile.objects.bulk_create(output_files)
+                SimulationFileBlob.objects.acquire_many(blob_references)
+
+        return new_simulations
+
+    def apply_status_updates(self, updates):
+        """
+        Apply status and execution timestamp updates reported by the cluster for many simulations at once.  Updates
+        for the same simulation are coalesced (later updates win, field by field) and written with one UPDATE per
+        STATUS_UPDATE_BATCH_SIZE simulations.
+
+        :param updates: Iterable of dictionaries with the key "id" and any of the keys in STATUS_UPDATE_FIELDS
+        :return: Number of simulations updated (ids of simulations that don't exist are ignored)
+        """
+        coalesced_updates = OrderedDict()
+        for update in updates:
+            coalesced_updates.setdefault(int(update["id"]), {}).update(
+                (field_name, update[field_name]) for field_name in STATUS_UPDATE_FIELDS if field_name in update
+            )
+
+        simulation_ids = [simulation_id for simulation_id, fields in coalesced_updates.items() if fields]
+        updated_count = 0
+
+        with transaction.atomic():
+            for i in range(0, len(simulation_ids), STATUS_UPDATE_BATCH_SIZE):
+                batch_ids = simulation_ids[i:i + STATUS_UPDATE_BATCH_SIZE]
+                # Locked, so a concurrent batch can't change the simulations between reading them and counting the
+                # changes (in id order, so two batches never wait for each other's locks)
+                current_values = self.select_for_update().filter(pk__in=batch_ids).order_by("id").values(
+                    "id", "group_id", "status", "execution_start_timestamp", "execution_end_timestamp"
+                )
+                duration_changes = defaultdict(list)
+                status_count_changes = defaultdict(int)
+
+                for current in current_values:
+                    new = dict(current, **coalesced_updates[current["id"]])
+                    old_duration, new_duration = get_duration(current), get_duration(new)
+                    if old_duration != new_duration:
+                        duration_changes[current["group_id"]].append((old_duration, new_duration))
+                    if current["status"] != new["status"]:
+                        status_count_changes[(current["group_id"], current["status"])] -= 1
+                        status_count_changes[(current["group_id"], new["status"])] += 1
+
+                updated_count += self.filter(pk__in=batch_ids).update(
+                    last_modified_timestamp=now(),
+                    **self._get_status_update_cases(batch_ids, coalesced_updates)
+                )
+                SimulationGroupStatistics.objects.apply_duration_changes(duration_changes)
+                SimulationGroupStatusCount.objects.apply_changes(status_count_changes)
+
+        return updated_count
+
+    def _get_status_update_cases(self, simulation_ids, coalesced_updates):
+        """
+        Build a CASE expression per updated field, so simulations getting different values are updated by the same
+        query.  Simulations without a new value for a field keep their current value.
+        """
+        cases = {}
+
+        for field_name in STATUS_UPDATE_FIELDS:
+            field = self.model._meta.get_field(field_name)
+            whens = [
+                When(pk=simulation_id, then=Value(coalesced_updates[simulation_id][field_name], output_field=field))
+                for simulation_id in simulation_ids if field_name in coalesced_updates[simulation_id]
+            ]
+            if whens:
+                cases[field_name] = Case(*whens, default=F(field_name), output_field=field)
+
+        return cases
+
+    @staticmethod
+    def _get_duration_sql():
+        """
+        SQL computing a simulation's execution duration in seconds.
+        """
+        if connection.vendor == "sqlite":
+            return "(julianday(execution_end_timestamp) - julianday(execution_start_timestamp)) * 86400.0"
+        elif connection.vendor == "postgresql":
+            return "EXTRACT(EPOCH FROM execution_end_timestamp - execution_start_timestamp)"
+        else:
+            raise NotImplementedError("Execution statistics are not implemented for %s" % connection.vendor)
+
+    def get_execution_statistics(self, group_by, keys=None):
+        """
+        Execution duration statistics of simulations per SimulationGroup or per ModelVersion.  All of it is computed
+        by the database in a single query (percentiles use window functions, which need SQLite 3.25+).  Simulations
+        without both execution timestamps are left out.
+
+        :param group_by: "group" or "version"
+        :param keys: Ids of the groups or versions to include, all of them if None
+        :return: Dictionary of group/version id -> dictionary with count, mean, min, max and percentiles (dictionary of
+        DURATION_PERCENTILES -> duration), durations in seconds
+        """
+        key_column = {"group": "group_id", "version": "version_id"}[group_by]
+        conditions = ["execution_start_timestamp IS NOT NULL", "execution_end_timestamp IS NOT NULL"]
+        params = []
+
+        if keys is not None:
+            keys = list(keys)
+            if not keys:
+                return {}
+            conditions.append("%s IN (%s)" % (key_column, ", ".join(["%s"] * len(keys))))
+            params.extend(keys)
+
+        # The percentile is the value at (0 based) position floor(p * (n - 1)) of the sorted durations
+        percentile_columns = ", ".join(
+            "MAX(CASE WHEN row_number - 1 <= %(p)s * (n - 1) AND %(p)s * (n - 1) < row_number THEN duration END)" % {
+                "p": percentile / 100.0
+            }
+            for percentile in DURATION_PERCENTILES
+        )
+        sql = """
+            WITH durations AS (
+                SELECT %(key_column)s AS statistics_key, %(duration)s AS duration
+                FROM %(table)s
+                WHERE %(conditions)s
+            ), ranked_durations AS (
+                SELECT statistics_key, duration,
+                    ROW_NUMBER() OVER (PARTITION BY statistics_key ORDER BY duration) AS row_number,
+                    COUNT(*) OVER (PARTITION BY statistics_key) AS n
+                FROM durations
+            )
+            SELECT statistics_key, COUNT(*), AVG(duration), MIN(duration), MAX(duration), %(percentile_columns)s
+            FROM ranked_durations
+            GROUP BY statistics_key
+        """ % {
+            "key_column": key_column,
+            "duration": self._get_duration_sql(),
+            "table": self.model._meta.db_table,
+            "conditions": " AND ".join(conditions),
+            "percentile_columns": percentile_columns,
+        }
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        return dict(
+            (row[0], {
+                "count": row[1],
+                "mean": row[2],
+                "min": row[3],
+                "max": row[4],
+                "percentiles": dict(zip(DURATION_PERCENTILES, row[5:])),
+            })
+            for row in rows
+        )
+
+    def get_status_histogram(self, group_by, keys=None):
+        """
+        Number of simulations in every status per SimulationGroup or per ModelVersion, in a single query.
+
+        :param group_by: "group" or "version"
+        :param keys: Ids of the groups or versions to include, all of them if None
+        :return: Dictionary of group/version id -> dictionary of status -> number of simulations
+        """
+        queryset = self.all()
+        if keys is not None:
+            queryset = queryset.filter(**{"%s__in" % group_by: keys})
+
+        histogram = defaultdict(dict)
+        for key, status, count in queryset.order_by().values_list("%s_id" % group_by, "status").annotate(Count("id")):
+            histogram[key][status] = count
+
+        return dict(histogram)
+
+    def _bulk_create_in_group(self, simulation_group, simulations):
+        """
+        Insert simulations into a SimulationGroup that has no other simulations.  bulk_create doesn't set primary
+        keys, so the new simulations are loaded back from the group (ids are assigned in insertion order).
+
+        :return: The inserted simulations, in the order they were given
+        """
+        self.bulk_create(simulations)
+
+        status_count_changes = defaultdict(int)
+        for simulation in simulations:
+            status_count_changes[(simulation_group.id, simulation.status)] += 1
+        SimulationGroupStatusCount.objects.apply_changes(status_count_changes)
+
+        return list(self.filter(group=simulation_group).order_by("id"))
+
+    @staticmethod
+    def _bulk_add_input_files(links):
+        """
+        Add input files to simulations with bulk inserts.
+
+        :param links: List of (simulation id, input file id) pairs
+        """
+        InputFileLink = SimulationInputFile.simulations.through
+        InputFileLink.objects.bulk_create([
+            InputFileLink(simulation_id=simulation_id, simulationinputfile_id=input_file_id)
+            for simulation_id, input_file_id in links
+        ])
+
+
 class Simulation(models.Model):
     """
     Represents a single execution of a simulation model.  Contains sufficient information about the particular
@@ -52,13 +483,58 @@ class Simulation(models.Model):
     version = models.ForeignKey(ModelVersion)
 
     command_line_arguments = models.TextField(null=True, blank=True)
-    status = models.ForeignKey()
+    status = models.CharField(max_length=sim_status.MAX_LENGTH, default=sim_status.READY_TO_RUN)  # See sim_status
 
     creation_timestamp = models.DateTimeField(auto_now_add=True)
     last_modified_timestamp = models.DateTimeField(auto_now=True)
     execution_start_timestamp = models.DateTimeField(null=True, blank=True)  # Collected on the cluster
     execution_end_timestamp = models.DateTimeField(null=True, blank=True)  # Collected on the cluster
 
+    objects = SimulationManager()
+
+    def save(self, *args, **kwargs):
+        """
+        Save the simulation and keep its group's status counts and execution statistics up to date in the same
+        transaction.  What they include is read back with the row locked, since another transaction may have changed
+        the simulation after it was loaded.
+        """
+        with transaction.atomic():
+            stored = None
+            if self.pk is not None and not kwargs.get("force_insert"):
+                stored = Simulation.objects.select_for_update().filter(pk=self.pk).values(
+                    "group_id", "status", "execution_start_timestamp", "execution_end_timestamp"
+                ).first()
+
+            super(Simulation, self).save(*args, **kwargs)
+
+            counted_as = (stored["group_id"], stored["status"]) if stored is not None else None
+            if counted_as != (self.group_id, self.status):
+                status_count_changes = defaultdict(int)
+                if counted_as is not None:
+                    status_count_changes[counted_as] -= 1
+                status_count_changes[(self.group_id, self.status)] += 1
+                SimulationGroupStatusCount.objects.apply_changes(status_count_changes)
+
+            duration_changes = defaultdict(list)
+            old_duration = get_duration(stored) if stored is not None else None
+            if stored is not None and stored["group_id"] != self.group_id:
+                # Moved to another group, it leaves the old group's statistics and joins the new group's
+                duration_changes[stored["group_id"]].append((old_duration, None))
+                old_duration = None
+            if old_duration != self.execution_duration:
+                duration_changes[self.group_id].append((old_duration, self.execution_duration))
+            SimulationGroupStatistics.objects.apply_duration_changes(duration_changes)
+
+    @property
+    def execution_duration(self):
+        """
+        Execution duration in seconds, None if the simulation hasn't finished.
+        """
+        return get_duration({
+            "execution_start_timestamp": self.execution_start_timestamp,
+            "execution_end_timestamp": self.execution_end_timestamp,
+        })
+
     @property
     def execution_duration_as_timedelta(self):
         """
@@ -70,33 +546,411 @@ class Simulation(models.Model):
         return self.execution_end_timestamp - self.execution_start_timestamp
 
     def copy(self, should_include_output=False):
-        simulation_group = SimulationGroup(submitted_by=self.group.submitted_by)
-        simulation_group.save()
+        return Simulation.objects.copy_simulations(
+            Simulation.objects.filter(pk=self.pk),
+            submitted_by=self.group.submitted_by,
+            should_include_output=should_include_output
+        )[0]
+
+    def __str__(self):
+        return "%s (v%s) - %s" % (self.id, self.version, self.status)
+
+    class Meta:
+        db_table = "simulation"
+        verbose_name = "Simulation"
+        verbose_name_plural = "Simulations"
+
+
+def uncount_deleted_simulation(sender, instance, **kwargs):
+    """
+    Remove a deleted simulation from its group's status counts and execution statistics.  Connected to post_delete
+    (rather than done in delete()) so simulations deleted along with other objects are counted too.  Queryset and
+    group deletes take care of their simulations in bulk instead.
+    """
+    if getattr(_simulation_deletes, "in_bulk", False):
+        return
+    SimulationGroupStatusCount.objects.apply_changes({(instance.group_id, instance.status): -1})
+    if instance.execution_duration is not None:
+        SimulationGroupStatistics.objects.apply_duration_changes({
+            instance.group_id: [(instance.execution_duration, None)]
+        })
+
+
+post_delete.connect(uncount_deleted_simulation, sender=Simulation)
+
+
+class SimulationGroupStatusCountManager(models.Manager):
+    """
+    Custom model manager for the number of simulations per status in simulation groups.
+    """
+
+    def apply_changes(self, status_count_changes):
+        """
+        Add to (or subtract from) the status counts of simulation groups.  Must run in the transaction that changes
+        the simulations, so the counts never disagree with them.
+
+        :param status_count_changes: Dictionary of (group id, status) -> change of the number of simulations
+        """
+        changed_group_ids = set()
+
+        for (group_id, status), change in status_count_changes.items():
+            if not change:
+                continue
+            changed_group_ids.add(group_id)
+
+            if self.filter(group_id=group_id, status=status).update(count=F("count") + change):
+                continue
+
+            # No simulation of the group had this status yet.  If the count goes down the group itself is being
+            # deleted, so there is nothing left to count.
+            if change > 0:
+                try:
+                    with transaction.atomic():
+                        self.create(group_id=group_id, status=status, count=change)
+                except IntegrityError:
+                    # Another transaction created the count in the meantime
+                    self.filter(group_id=group_id, status=status).update(count=F("count") + change)
+
+        # Tell whoever is watching the groups' progress, once the new counts are visible to them
+        for group_id in changed_group_ids:
+            transaction.on_commit(lambda group_id=group_id: simulation_group_changes.publish(group_id))
+
+    def recount(self, group_ids):
+        """
+        Recompute the status counts of simulation groups from their simulations, to repair them if they ever drift.
+        """
+        group_ids = list(group_ids)
+
+        with transaction.atomic():
+            # Lock the groups' simulations so no status changes while they are counted
+            list(Simulation.objects.select_for_update().filter(group_id__in=group_ids).values_list("id", flat=True))
+            self.filter(group_id__in=group_ids).delete()
+            self.bulk_create([
+                self.model(group_id=group_id, status=status, count=count)
+                for group_id, status, count in Simulation.objects.filter(group_id__in=group_ids).order_by().values_list(
+                    "group_id", "status"
+                ).annotate(Count("id"))
+            ])
+
+
+class SimulationGroupStatusCount(models.Model):
+    """
+    Number of simulations in a group with a particular status.  Maintained whenever simulations are created, change
+    status or are deleted, so a group's progress can be shown without counting its simulations.
+    """
+    group = models.ForeignKey(SimulationGroup, related_name="status_counts")
+    status = models.TextField()
+    count = models.BigIntegerField(default=0)
+
+    objects = SimulationGroupStatusCountManager()
+
+    class Meta:
+        db_table = "simulation_group_status_count"
+        unique_together = [("group", "status")]
+        verbose_name = "SimulationGroupStatusCount"
+        verbose_name_plural = "SimulationGroupStatusCounts"
+
+
+# Execution durations are counted in buckets of powers of 2 seconds: bucket 0 is [0, 1) seconds, bucket n is
+# [2^(n-1), 2^n) seconds and the last bucket holds everything from 2^(DURATION_BUCKET_COUNT-2) seconds (~194 days) up.
+DURATION_BUCKET_COUNT = 26
 
-        new_simulation = Simulation.objects.create(
-            group=simulation_group,
-            version=self.version,
-            status=
+
+def get_duration_bucket(duration):
+    if duration < 1:
+        return 0
+    # frexp(duration)[1] is n for 2^(n-1) <= duration < 2^n, without logarithm rounding errors at powers of 2
+    return min(math.frexp(duration)[1], DURATION_BUCKET_COUNT - 1)
+
+
+class SimulationGroupStatisticsManager(models.Manager):
+    """
+    Custom model manager for the execution statistics rollups of simulation groups.
+    """
+
+    def refresh(self, group_ids):
+        """
+        Create or recompute the rollups of simulation groups from their simulations.  Once a group has a rollup it is
+        maintained incrementally by SimulationManager.apply_status_updates, Simulation.save() and simulation deletes.
+        """
+        group_ids = list(group_ids)
+        bucket_sql = "CASE %s ELSE %s END" % (
+            " ".join(
+                "WHEN duration < %s THEN %s" % (2 ** bucket, bucket) for bucket in range(DURATION_BUCKET_COUNT - 1)
+            ),
+            DURATION_BUCKET_COUNT - 1
         )
+        sql = """
+            SELECT group_id, %(bucket)s AS bucket, COUNT(*), SUM(duration), MIN(duration), MAX(duration)
+            FROM (
+                SELECT group_id, %(duration)s AS duration
+                FROM %(table)s
+                WHERE execution_start_timestamp IS NOT NULL AND execution_end_timestamp IS NOT NULL
+                    AND group_id IN (%(group_ids)s)
+            ) AS durations
+            GROUP BY group_id, bucket
+        """ % {
+            "bucket": bucket_sql,
+            "duration": Simulation.objects._get_duration_sql(),
+            "table": Simulation._meta.db_table,
+            "group_ids": ", ".join(["%s"] * len(group_ids)),
+        }
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, group_ids)
+                rows = cursor.fetchall()
+
+            rollups = dict((group_id, self.model(group_id=group_id, duration_histogram={})) for group_id in group_ids)
+            for group_id, bucket, count, total, minimum, maximum in rows:
+                rollups[group_id].add_bucket(bucket, count, total, minimum, maximum)
+
+            self.filter(group_id__in=group_ids).delete()
+            self.bulk_create(rollups.values())
+
+    def apply_duration_changes(self, duration_changes):
+        """
+        Apply changes of simulations' execution durations to the rollups of the groups that have one.
+
+        :param duration_changes: Dictionary of group id -> list of (old duration, new duration), None for unfinished
+        """
+        if not duration_changes:
+            return
+
+        for rollup in self.select_for_update().filter(group_id__in=list(duration_changes)):
+            for old_duration, new_duration in duration_changes[rollup.group_id]:
+                if old_duration is not None:
+                    rollup.add_bucket(get_duration_bucket(old_duration), -1, -old_duration, None, None)
+                if new_duration is not None:
+                    rollup.add_bucket(get_duration_bucket(new_duration), 1, new_duration, new_duration, new_duration)
+            rollup.save()
+
+
+class SimulationGroupStatistics(models.Model):
+    """
+    Incrementally maintained execution duration statistics of a simulation group, for groups that are too big to
+    compute statistics over on every page load.  Percentiles are estimated from a histogram of durations.  min and
+    max only ever widen when durations change; refreshing the rollup makes them exact again.
+    """
+    group = models.OneToOneField(SimulationGroup, related_name="statistics")
+
+    duration_count = models.BigIntegerField(default=0)
+    duration_sum = models.FloatField(default=0)
+    duration_min = models.FloatField(null=True, blank=True)
+    duration_max = models.FloatField(null=True, blank=True)
+    duration_histogram = JSONField(default=dict)  # Bucket (see get_duration_bucket) -> number of simulations
+
+    last_modified_timestamp = models.DateTimeField(auto_now=True)
+
+    objects = SimulationGroupStatisticsManager()
+
+    def add_bucket(self, bucket, count, total, minimum, maximum):
+        # JSON object keys are strings
+        bucket = str(bucket)
+        self.duration_histogram[bucket] = self.duration_histogram.get(bucket, 0) + count
+        self.duration_count += count
+        self.duration_sum += total
+
+        if minimum is not None and (self.duration_min is None or minimum < self.duration_min):
+            self.duration_min = minimum
+        if maximum is not None and (self.duration_max is None or maximum > self.duration_max):
+            self.duration_max = maximum
+
+    def get_percentile(self, percentile):
+        """
+        Estimate a percentile of the durations from the histogram, accurate to within the bucket's power of 2.
+        """
+        position = percentile / 100.0 * (self.duration_count - 1)
+        seen = 0
+
+        for bucket in range(DURATION_BUCKET_COUNT):
+            seen += self.duration_histogram.get(str(bucket), 0)
+            if seen > position:
+                # Geometric middle of the bucket, within the durations actually seen
+                estimate = 0.5 if bucket == 0 else 2 ** (bucket - 1) * math.sqrt(2)
+                return min(max(estimate, self.duration_min), self.duration_max)
+
+        return self.duration_max
+
+    def as_dict(self):
+        if not self.duration_count:
+            return None
 
-        # Add simulation input files to the new simulation
-        for input_file in self.input_files.all():
-            new_simulation.input_files.add(input_file)
+        return {
+            "count": self.duration_count,
+            "mean": self.duration_sum / self.duration_count,
+            "min": self.duration_min,
+            "max": self.duration_max,
+            "percentiles": dict((percentile, self.get_percentile(percentile)) for percentile in DURATION_PERCENTILES),
+        }
 
-        if should_include_output:
-            # Add simulation output files to the new simulation
-            for output_file in self.output_files.all():
-                new_simulation.output_files.add(output_file.copy())
+    class Meta:
+        db_table = "simulation_group_statistics"
+        verbose_name = "SimulationGroupStatistics"
+        verbose_name_plural = "SimulationGroupStatistics"
+
+
+class SimulationFileBlobManager(models.Manager):
+    """
+    Custom model manager for the content-addressed storage of simulation file contents.
+    """
 
-        return new_simulation
+    @staticmethod
+    def get_blob_name(md5):
+        # Fan out into two directory levels so no single directory ends up holding every blob
+        return "blobs/%s/%s/%s" % (md5[0:2], md5[2:4], md5)
+
+    def store(self, contents):
+        """
+        Store contents in the blob store and take a reference to them.  Contents that are already stored are not
+        kept twice; the existing blob gets one more reference instead.
+
+        Contents are hashed while they are streamed to storage, so they are read exactly once and never have to fit
+        in memory.
+
+        :param contents: File contents (a string, a file-like object or an iterable of strings)
+        :return: SimulationFileBlob holding the contents
+        """
+        if isinstance(contents, six.text_type):
+            contents = contents.encode("utf-8")
+        if isinstance(contents, (bytes, bytearray)):
+            contents = BytesIO(contents)
+
+        # The md5 isn't known until everything has been read, so the contents land under a temporary name first.
+        # This happens before the database row is touched so a large write doesn't hold a database lock.
+        reader = File(Md5AndFileSizeReader(contents))
+        reader.DEFAULT_CHUNK_SIZE = get_chunk_size()
+        temporary_name = default_storage.save("blobs/incoming/%s" % uuid4().hex, reader)
+
+        return self.adopt(temporary_name, reader.file.hexdigest(), reader.file.size)
+
+    def adopt(self, stored_name, md5, size):
+        """
+        Move a file that is already in storage into the blob store and take a reference to its contents.  The file
+        is not read; md5 and size must be known already.
+
+        :param stored_name: Name of the file in the default storage, the file is gone when this returns
+        :return: SimulationFileBlob holding the contents
+        """
+        name = self.get_blob_name(md5)
+
+        with transaction.atomic():
+            # The blob's row is locked (or newly inserted, which locks its md5) before looking at the file, so a
+            # concurrent release can't delete the file after it was found to be there (see _delete_unused_file)
+            blob = self.select_for_update().filter(md5=md5).first()
+            if blob is None:
+                try:
+                    with transaction.atomic():
+                        blob = self.create(md5=md5, size=size, file=name)
+                except IntegrityError:
+                    # Another transaction stored the same contents in the meantime
+                    blob = self.select_for_update().get(md5=md5)
+
+            # A file left behind by a rolled back transaction holds the same contents by definition, so it is reused
+            if default_storage.exists(name):
+                default_storage.delete(stored_name)
+            else:
+                self._move(stored_name, name)
+
+            self.acquire(blob)
+
+        return blob
+
+    @staticmethod
+    def _move(old_name, new_name):
+        try:
+            old_path, new_path = default_storage.path(old_name), default_storage.path(new_name)
+        except NotImplementedError:
+            # Storage without local paths has no rename, so fall back to copying the file
+            with default_storage.open(old_name, "rb") as old_file:
+                default_storage.save(new_name, old_file)
+            default_storage.delete(old_name)
+            return
+
+        if not os.path.isdir(os.path.dirname(new_path)):
+            try:
+                os.makedirs(os.path.dirname(new_path))
+            except OSError:
+                # Another process created the directory in the meantime
+                if not os.path.isdir(os.path.dirname(new_path)):
+                    raise
+        os.rename(old_path, new_path)
+
+    def acquire(self, blob):
+        """
+        Take one more reference to a blob.  This is what makes copying a simulation file O(1) in its size.
+        """
+        if not self.filter(pk=blob.pk).update(reference_count=F("reference_count") + 1):
+            raise SimulationFileBlob.DoesNotExist("Blob %s has been released" % blob.pk)
+
+    def acquire_many(self, blob_references):
+        """
+        Take references to many blobs at once.
+
+        :param blob_references: Dictionary of blob id -> number of references to take
+        """
+        # One update per distinct number of references, which is usually a single update
+        blob_ids_by_references = defaultdict(list)
+        for blob_id, references in blob_references.items():
+            blob_ids_by_references[references].append(blob_id)
+
+        for references, blob_ids in blob_ids_by_references.items():
+            if self.filter(pk__in=blob_ids).update(reference_count=F("reference_count") + references) != len(blob_ids):
+                raise SimulationFileBlob.DoesNotExist("Some of the blobs %s have been released" % blob_ids)
+
+    def release(self, blob_id):
+        """
+        Drop one reference to a blob.  The blob and its file are deleted once nothing refers to them anymore.
+        """
+        with transaction.atomic():
+            blob = self.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return
+
+            self.filter(pk=blob_id).update(reference_count=F("reference_count") - 1)
+            if blob.reference_count <= 1:
+                # Raises ProtectedError (and nothing is deleted) if files still refer to the blob, which means its
+                # reference count is wrong
+                self.filter(pk=blob_id).delete()
+                # Only remove the file once the row is gone for good
+                transaction.on_commit(lambda: self._delete_unused_file(blob.md5, blob.file.name))
+
+    def _delete_unused_file(self, md5, name):
+        """
+        Delete the file of a released blob, unless the same contents have been stored again since the blob was
+        released.  Inserting a row with the blob's md5 waits for (and then fails because of) any transaction adopting
+        the same contents, so the file is never deleted from under one.
+        """
+        try:
+            with transaction.atomic():
+                self.create(md5=md5, size=0, file=name)
+                default_storage.delete(name)
+                # The row was only a lock
+                transaction.set_rollback(True)
+        except IntegrityError:
+            pass
+
+
+class SimulationFileBlob(models.Model):
+    """
+    The contents of one or more simulation files.  Contents are stored once per md5, no matter how many simulation
+    files (or copies of simulation files) refer to them.  Blobs are immutable; setting the contents of a simulation
+    file points it at a different blob.
+    """
+    md5 = models.CharField(max_length=32, unique=True)
+    size = models.BigIntegerField()
+    file = models.FileField(max_length=255)
+    reference_count = models.BigIntegerField(default=0)
+
+    objects = SimulationFileBlobManager()
 
     def __str__(self):
-        return "%s (v%s) - %s" % (self.id, self.version, self.status)
+        return "%s (%s references)" % (self.md5, self.reference_count)
 
     class Meta:
-        db_table = "simulation"
-        verbose_name = "Simulation"
-        verbose_name_plural = "Simulations"
+        db_table = "simulation_file_blob"
+        verbose_name = "SimulationFileBlob"
+        verbose_name_plural = "SimulationFileBlobs"
 
 
 class SimulationFile(models.Model):
@@ -107,6 +961,8 @@ class SimulationFile(models.Model):
     file = models.FileField(default=None)  # Using default=None to force an integrity issue if there is not a value provided
     md5 = models.TextField(default=None)  # Using default=None to force an integrity issue if there is not a value provided
     size = models.BigIntegerField()
+    # PROTECT, so a blob whose reference count has drifted can't take the files still using it down with it
+    blob = models.ForeignKey(SimulationFileBlob, null=True, blank=True, on_delete=models.PROTECT)
 
     def _get_size(self):
         return self.file.size
@@ -117,27 +973,121 @@ class SimulationFile(models.Model):
     def get_contents(self):
         return self.file.read()
 
+    def iter_contents(self, chunk_size=None, offset=0, length=None):
+        """
+        Iterate over the file's contents in chunks, so large files never have to fit in memory.  offset and length
+        restrict the iteration to a byte range of the contents.
+        """
+        chunk_size = get_chunk_size(chunk_size)
+        remaining = self.size - offset if length is None else length
+
+        with self.file.storage.open(self.file.name, "rb") as contents_file:
+            if offset:
+                contents_file.seek(offset)
+
+            while remaining > 0:
+                data = contents_file.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    @contextmanager
+    def open_contents_buffer(self):
+        """
+        Read-only, zero-copy access to the file's contents as a memoryview (a read-only buffer on Python 2, which
+        can't make memoryviews of memory maps).  The file is memory-mapped, so slicing the buffer only pages in the
+        parts that are actually used instead of copying the whole file into memory.  The buffer (and any slices of it)
+        must not be used after the with block.
+
+        Only works with storage that keeps files on the local filesystem, use read_contents_range for other storage.
+
+            with simulation_file.open_contents_buffer() as contents:
+                header = bytes(contents[0:64])
+        """
+        try:
+            path = self.file.path
+        except NotImplementedError:
+            raise NotImplementedError("Storage %s does not support memory mapping, use read_contents_range instead" %
+                                      self.file.storage.__class__.__name__)
+
+        if self.size == 0:
+            # Empty files can't be memory-mapped
+            yield buffer(b"") if six.PY2 else memoryview(b"")  # noqa, buffer is a Python 2 builtin
+            return
+
+        with open(path, "rb") as contents_file:
+            contents_map = mmap.mmap(contents_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if six.PY2:
+            # Python 2 doesn't stop an mmap from being closed while buffers of it are alive, so it is left to be
+            # unmapped when the last buffer is garbage collected
+            yield buffer(contents_map)  # noqa
+            return
+
+        contents_view = memoryview(contents_map)
+        try:
+            yield contents_view
+        finally:
+            contents_view.release()
+            try:
+                contents_map.close()
+            except BufferError:
+                # A slice of the buffer is still alive, the mapping is released once it is garbage collected
+                pass
+
+    def read_contents_range(self, offset, length):
+        """
+        Read length bytes of the file's contents starting at offset, without reading anything else.  Works with any
+        storage that supports seeking.
+        """
+        with self.file.storage.open(self.file.name, "rb") as contents_file:
+            contents_file.seek(offset)
+            return contents_file.read(length)
+
+    def _use_blob(self, blob):
+        self.blob = blob
+        self.file = blob.file.name
+        self.md5 = blob.md5
+        self.size = blob.size
+
     def _set_contents(self, contents, is_binary=True):
-        self.md5, self.size = get_md5_and_file_size(
-            data_source=self.get_contents(), supposed_file_size=self.file.size,
-            callback_function=self._update_md5_progress
-        )
+        old_blob_id = self.blob_id
+
+        with transaction.atomic():
+            self._use_blob(SimulationFileBlob.objects.store(contents))
+            self.save()
 
-        self.save()
+            if old_blob_id is not None:
+                SimulationFileBlob.objects.release(old_blob_id)
+
+    def move_to_blob_store(self):
+        """
+        Store the contents of a file saved before the blob store existed (one without a blob) in the blob store.  The
+        old file is left alone, other simulation files may still refer to it.
+        """
+        if self.blob_id is not None:
+            return
+
+        with default_storage.open(self.file.name, "rb") as old_file:
+            with transaction.atomic():
+                self._use_blob(SimulationFileBlob.objects.store(old_file))
+                self.save()
 
     def copy(self):
+        # Copies share the original's blob, so the contents are never read or written here (except once for files
+        # that aren't in the blob store yet)
+        self.move_to_blob_store()
         if isinstance(self, SimulationInputFile):
-            new_simulation_file = SimulationInputFile.objects.create_file(
-                contents=self.get_contents(),
+            new_simulation_file = SimulationInputFile.objects.create_file_from_blob(
+                blob=self.blob,
                 name=self.name,
-                metadata=self.metadata,
                 created_by=self.created_by
             )
         elif isinstance(self, SimulationOutputFile):
-            new_simulation_file = SimulationOutputFile.objects.create_file(
-                contents=self.get_contents(),
+            new_simulation_file = SimulationOutputFile.objects.create_file_from_blob(
+                blob=self.blob,
                 name=self.name,
-                metadata=self.metadata,
             )
         else:
             raise Exception("SimulationFile is not of type SimulationInputFile nor SimulationOutputFile")
@@ -160,11 +1110,44 @@ class SimulationFileModelManager(models.Manager):
     """
 
     def create_file(self, contents, **kwargs):
-        sim_file = self.create(**kwargs)
-        sim_file._set_contents(contents)
+        """
+        Create a simulation file.  Contents can be a string, a file-like object or an iterable of strings; they are
+        streamed to storage and hashed in a single pass.
+        """
+        with transaction.atomic():
+            blob = SimulationFileBlob.objects.store(contents)
+            return self._create_file_with_blob(blob, **kwargs)
+
+    def create_file_from_stored_file(self, stored_name, md5, size, **kwargs):
+        """
+        Create a simulation file from a file that is already in storage and whose md5 and size are known, without
+        reading it again.  The stored file is moved into the blob store.
+        """
+        with transaction.atomic():
+            blob = SimulationFileBlob.objects.adopt(stored_name, md5, size)
+            return self._create_file_with_blob(blob, **kwargs)
+
+    def create_file_from_blob(self, blob, **kwargs):
+        with transaction.atomic():
+            SimulationFileBlob.objects.acquire(blob)
+            return self._create_file_with_blob(blob, **kwargs)
+
+    def _create_file_with_blob(self, blob, **kwargs):
+        sim_file = self.model(**kwargs)
+        sim_file._use_blob(blob)
+        sim_file.save(force_insert=True)
         return sim_file
 
 
+def release_simulation_file_blob(sender, instance, **kwargs):
+    """
+    Drop the reference a deleted simulation file held on its blob.  Connected to post_delete (rather than done in
+    delete()) so queryset deletes release their blobs too.
+    """
+    if instance.blob_id is not None:
+        SimulationFileBlob.objects.release(instance.blob_id)
+
+
 class SimulationInputFile(SimulationFile):
     """
     An input file for a simulation.  An input file can be shared among multiple simulations.  An input file is
@@ -181,15 +1164,22 @@ class SimulationInputFile(SimulationFile):
     simulations = models.ManyToManyField(Simulation,
                                          help_text='the simulations that used this file as input',
                                          related_name='input_files')
-    created_by = models.ForeignKey(DimUser,
+    created_by = models.ForeignKey(User,
                                    help_text='who created the file')
     created_when = models.DateTimeField(help_text='when was the file created',
                                         auto_now_add=True)
 
     objects = SimulationFileModelManager()
 
+    class Meta:
+        # Each concrete simulation file model needs a table of its own, the abstract base's would be shared
+        db_table = "simulation_input_file"
+        verbose_name = "SimulationInputFile"
+        verbose_name_plural = "SimulationInputFiles"
+
     def set_contents(self, contents):
-        simulations = self.simulations.all()
+        # Two simulations are enough to tell the file is shared, no need to load every one of them
+        simulations = list(self.simulations.all()[:2])
 
         if len(simulations) > 1:
             raise RuntimeError("File is shared by multiple simulations.")
@@ -207,10 +1197,296 @@ class SimulationOutputFile(SimulationFile):
     simulation = models.ForeignKey(Simulation,
                                    null=True,
                                    blank=True,
-                                   help_text='the simulation that produced this file')
+                                   help_text='the simulation that produced this file',
+                                   related_name='output_files')
 
     objects = SimulationFileModelManager()
 
+    class Meta:
+        db_table = "simulation_output_file"
+        verbose_name = "SimulationOutputFile"
+        verbose_name_plural = "SimulationOutputFiles"
+
+
+post_delete.connect(release_simulation_file_blob, sender=SimulationInputFile)
+post_delete.connect(release_simulation_file_blob, sender=SimulationOutputFile)
+
+
+# md5 of the uploaded prefix of every upload in progress in this process:
+# {upload id: (md5, number of bytes hashed, time it was last advanced)}.
+# hashlib objects can't be stored in the database, so this lives in memory, in the process that received the first
+# chunk.  Chunks that go to other processes (or arrive after a restart) aren't hashed as they arrive; complete() hashes
+# whatever the running md5 doesn't cover in one sequential pass over the partial file.  md5s of uploads that stop
+# receiving chunks are forgotten after CHUNKED_UPLOAD_EXPIRY_DAYS, see forget_stale_upload_md5s.
+_upload_md5s = {}
+# Locks serializing the chunks of an upload, shared by uploads with the same id modulo their number, so chunks of
+# different uploads are (mostly) hashed in parallel and the number of locks doesn't grow with the number of uploads
+_upload_locks = [threading.Lock() for i in range(64)]
+
+
+def get_upload_lock(upload_id):
+    return _upload_locks[upload_id % len(_upload_locks)]
+
+
+def get_upload_expiry():
+    return timedelta(days=getattr(settings, "CHUNKED_UPLOAD_EXPIRY_DAYS", 7))
+
+
+def forget_stale_upload_md5s():
+    cutoff = time.time() - get_upload_expiry().total_seconds()
+    for upload_id, (md5, hashed_size, last_used) in list(_upload_md5s.items()):
+        if last_used < cutoff:
+            _upload_md5s.pop(upload_id, None)
+
+
+class SimulationFileUploadManager(models.Manager):
+    """
+    Custom model manager for chunked simulation file uploads.
+    """
+
+    def create_upload(self, name, size, uploaded_by, chunk_size=None):
+        max_size = getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 10 * 1024 ** 3)
+        if not 0 <= size <= max_size:
+            raise ValueError("Invalid file size %s, files can be up to %s bytes" % (size, max_size))
+
+        with transaction.atomic():
+            upload = self.create(
+                name=name,
+                size=size,
+                chunk_size=chunk_size or getattr(settings, "CHUNKED_UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024),
+                uploaded_by=uploaded_by,
+            )
+
+            # Chunks are written straight into the partial file at their offset, in whatever order they arrive
+            partial_file_path = upload.get_partial_file_path()
+            if not os.path.isdir(os.path.dirname(partial_file_path)):
+                os.makedirs(os.path.dirname(partial_file_path))
+            try:
+                with open(partial_file_path, "wb") as partial_file:
+                    partial_file.truncate(size)
+            except EnvironmentError:
+                # The upload row is rolled back, don't leave its file behind either
+                if os.path.exists(partial_file_path):
+                    os.remove(partial_file_path)
+                raise
+
+        return upload
+
+    def delete_stale(self, days=None):
+        """
+        Delete uploads that haven't been completed and haven't received a chunk for days (the
+        CHUNKED_UPLOAD_EXPIRY_DAYS setting by default), together with their partial files.
+
+        :return: Number of uploads deleted
+        """
+        expiry = timedelta(days=days) if days is not None else get_upload_expiry()
+        stale_uploads = list(
+            self.filter(simulation_file__isnull=True, last_modified_timestamp__lt=now() - expiry).order_by("id")
+        )
+
+        for upload in stale_uploads:
+            # delete() clears the id the stored name is made of
+            upload_id, stored_name = upload.id, upload.get_stored_name()
+            upload.delete()
+            default_storage.delete(stored_name)
+            _upload_md5s.pop(upload_id, None)
+
+        return len(stale_uploads)
+
+
+class SimulationFileUpload(models.Model):
+    """
+    A simulation input file being uploaded in chunks.  Chunks can arrive in parallel and in any order, and an
+    interrupted upload is resumed by sending the chunks that are not in received_chunks yet.
+
+    The contents are hashed incrementally as the uploaded prefix of the file grows, so completing the upload creates
+    the SimulationInputFile without reading the file again.  Chunks that arrive ahead of the prefix are read back
+    from the partial file once the gap before them is filled.  The running md5 is kept in the memory of the process
+    that received the first chunk; if the upload moves to another process, it is hashed in one pass on completion.
+    """
+    name = models.TextField()
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    uploaded_by = models.ForeignKey(User)
+
+    received_chunks = JSONField(default=list)
+    hashed_size = models.BigIntegerField(default=0)  # Size of the uploaded prefix that has been hashed so far
+    simulation_file = models.ForeignKey(SimulationInputFile, null=True, blank=True)  # Set when the upload completes
+
+    creation_timestamp = models.DateTimeField(auto_now_add=True)
+    last_modified_timestamp = models.DateTimeField(auto_now=True)
+
+    objects = SimulationFileUploadManager()
+
+    def get_stored_name(self):
+        return "uploads/%s.part" % self.id
+
+    def get_partial_file_path(self):
+        return default_storage.path(self.get_stored_name())
+
+    def get_chunk_count(self):
+        return (self.size + self.chunk_size - 1) // self.chunk_size
+
+    def get_chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    @property
+    def is_complete(self):
+        return self.simulation_file_id is not None
+
+    def write_chunk(self, index, data):
+        """
+        Write one chunk of the file and hash as much of the file as is now uploaded without gaps.
+        """
+        if self.is_complete:
+            raise ValueError("Upload is already complete")
+        if not 0 <= index < self.get_chunk_count():
+            raise ValueError("Invalid chunk index %s" % index)
+        if len(data) != self.get_chunk_length(index):
+            raise ValueError("Chunk %s should be %s bytes, got %s" % (index, self.get_chunk_length(index), len(data)))
+
+        with open(self.get_partial_file_path(), "r+b") as partial_file:
+            partial_file.seek(index * self.chunk_size)
+            partial_file.write(data)
+
+        # Hashing is sequential by nature, so only one chunk of an upload at a time gets to advance its md5
+        with get_upload_lock(self.pk), transaction.atomic():
+            upload = SimulationFileUpload.objects.select_for_update().get(pk=self.pk)
+            received_chunks = set(upload.received_chunks)
+            received_chunks.add(index)
+
+            upload.received_chunks = sorted(received_chunks)
+            upload.hashed_size = max(upload.hashed_size, upload._hash_received_prefix(received_chunks, index, data))
+            upload.save(update_fields=["received_chunks", "hashed_size", "last_modified_timestamp"])
+
+        self.received_chunks, self.hashed_size = upload.received_chunks, upload.hashed_size
+
+    def _hash_received_prefix(self, received_chunks, index, data):
+        """
+        Advance this process's md5 of the upload over the chunks received without gaps.
+
+        :return: Number of bytes hashed, 0 if this process doesn't hash the upload
+        """
+        md5, hashed_size, last_used = _upload_md5s.get(self.pk, (None, 0, None))
+        if md5 is None:
+            if index != 0:
+                # Another process has the md5 (or had it, before a restart), complete() hashes what it doesn't cover
+                return 0
+            md5 = hashlib.md5()
+        else:
+            # Hash a copy, so an error halfway through doesn't leave an md5 that doesn't match its size
+            md5 = md5.copy()
+
+        next_index = hashed_size // self.chunk_size
+        with open(self.get_partial_file_path(), "rb") as partial_file:
+            while next_index in received_chunks:
+                if next_index == index:
+                    md5.update(data)
+                else:
+                    # This chunk arrived ahead of the chunks before it, or in another process, so it has to be read back
+                    partial_file.seek(next_index * self.chunk_size)
+                    md5.update(partial_file.read(self.get_chunk_length(next_index)))
+
+                hashed_size += self.get_chunk_length(next_index)
+                next_index += 1
+
+        _upload_md5s[self.pk] = (md5, hashed_size, time.time())
+        forget_stale_upload_md5s()
+        return hashed_size
+
+    def _get_md5(self):
+        with get_upload_lock(self.pk):
+            md5, hashed_size, last_used = _upload_md5s.get(self.pk, (None, 0, None))
+        md5 = md5.copy() if md5 is not None else hashlib.md5()
+
+        # Whatever the running md5 doesn't cover (all of the file if it is in another process) is hashed in one pass
+        with open(self.get_partial_file_path(), "rb") as partial_file:
+            partial_file.seek(hashed_size)
+            while hashed_size < self.size:
+                chunk = partial_file.read(min(self.chunk_size, self.size - hashed_size))
+                if not chunk:
+                    raise ValueError("Partial file of upload %s is shorter than %s bytes" % (self.pk, self.size))
+                md5.update(chunk)
+                hashed_size += len(chunk)
+
+        return md5
+
+    def complete(self, **kwargs):
+        """
+        Turn a fully uploaded file into a SimulationInputFile.
+
+        :param kwargs: Additional fields for the SimulationInputFile
+        :return: The new SimulationInputFile
+        """
+        if self.is_complete:
+            return self.simulation_file
+        if len(self.received_chunks) != self.get_chunk_count():
+            raise ValueError("Upload is missing %s chunks" % (self.get_chunk_count() - len(self.received_chunks)))
+
+        md5 = self._get_md5()
+        with transaction.atomic():
+            self.simulation_file = SimulationInputFile.objects.create_file_from_stored_file(
+                self.get_stored_name(), md5.hexdigest(), self.size, name=self.name, **kwargs
+            )
+            self.save(update_fields=["simulation_file", "last_modified_timestamp"])
+
+        _upload_md5s.pop(self.pk, None)
+        return self.simulation_file
+
+    def __str__(self):
+        return "%s - %s" % (self.id, self.name)
+
+    class Meta:
+        db_table = "simulation_file_upload"
+        verbose_name = "SimulationFileUpload"
+        verbose_name_plural = "SimulationFileUploads"
+
+
+# Models of the items users keep in folders, each with a "folder" foreign key to Folder.  Folders count as empty
+# unless they have subfolders or items of one of these models.
+FOLDER_ITEM_MODELS = []
+
+
+class FolderManager(RemoveDeletedManager):
+    """
+    Custom model manager for folders.  Excludes deleted folders.
+    """
+
+    def get_tree(self, owner):
+        """
+        Load a user's whole folder hierarchy in two queries: one for the folders and one for the number of items in
+        each of them.  Every folder gets these attributes:
+            subfolders - list of the folder's subfolders ordered by sort_order
+            subfolder_count - number of subfolders
+            item_count - number of items in the folder (not counting subfolders' items)
+
+        :return: List of top level folders ordered by sort_order
+        """
+        folders = list(self.filter(owner=owner).order_by("sort_order", "id"))
+        folders_by_id = dict((folder.id, folder) for folder in folders)
+        item_counts = defaultdict(int)
+        for item_model in FOLDER_ITEM_MODELS:
+            items = item_model.objects.filter(folder__in=self.filter(owner=owner)).order_by()
+            for folder_id, count in items.values_list("folder").annotate(count=Count("id")):
+                item_counts[folder_id] += count
+        root_folders = []
+
+        for folder in folders:
+            folder.subfolders = []
+            folder.item_count = item_counts.get(folder.id, 0)
+
+        for folder in folders:
+            # Folders in someone else's (or a deleted) folder are shown at the top level
+            if folder.parent_folder_id in folders_by_id:
+                folders_by_id[folder.parent_folder_id].subfolders.append(folder)
+            else:
+                root_folders.append(folder)
+
+        for folder in folders:
+            folder.subfolder_count = len(folder.subfolders)
+
+        return root_folders
+
 
 class Folder(models.Model):
     name = models.TextField()
@@ -227,7 +1503,7 @@ class Folder(models.Model):
     deletion_timestamp = models.DateTimeField(null=True, blank=True)
 
     all_objects = models.Manager()  # Default manager - will include deleted as well
-    objects = RemoveDeletedManager()  # Override default manager to exclude deleted
+    objects = FolderManager()  # Override default manager to exclude deleted
 
     class NotEmpty(Exception):
         pass
@@ -239,28 +1515,151 @@ class Folder(models.Model):
             self.deletion_timestamp = now()
             self.save()
 
+    def _get_subtree_sql(self):
+        """
+        SQL selecting the ids of this folder and all of its (not deleted) subfolders, at any depth, with a recursive
+        common table expression (supported by SQLite 3.8.3+ and PostgreSQL).
+        """
+        sql = """
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM folder WHERE id = %s
+                UNION ALL
+                SELECT folder.id FROM folder JOIN subtree ON folder.parent_folder_id = subtree.id
+                WHERE folder.deletion_timestamp IS NULL
+            )
+            SELECT id FROM subtree
+        """
+        return sql, [self.id]
+
+    def delete_subtree(self):
+        """
+        Delete this folder together with all of its subfolders.  Raises NotEmpty if any folder in the subtree has
+        items in it.  Takes one query to check and one update to delete, no matter how big the subtree is.
+        """
+        subtree_sql, subtree_params = self._get_subtree_sql()
+
+        with transaction.atomic():
+            for item_model in FOLDER_ITEM_MODELS:
+                if item_model.objects.extra(where=["folder_id IN (%s)" % subtree_sql], params=subtree_params).exists():
+                    raise self.NotEmpty
+
+            self.deletion_timestamp = now()
+            Folder.all_objects.extra(where=["id IN (%s)" % subtree_sql], params=subtree_params).update(
+                deletion_timestamp=self.deletion_timestamp,
+                last_modified_timestamp=self.deletion_timestamp
+            )
+
     @property
     def is_empty(self):
-        subfolder_list = Folder.objects.filter(parent_folder=self.id)
-        something_list = Something.objects.filter(folder=self.id)
-
-        if subfolder_list.count() == 0 and something_list.count() == 0:
-            return True
-        else:
-            return False
+        return not Folder.objects.filter(parent_folder=self.id).exists() and \
+            not any(item_model.objects.filter(folder=self.id).exists() for item_model in FOLDER_ITEM_MODELS)
 
     class Meta:
         db_table = "folder"
+        index_together = [("owner", "parent_folder", "deletion_timestamp")]
         verbose_name = "Folder"
         verbose_name_plural = "Folders"
 
 
+# Locations per UPDATE of update_grid_cells, keeps the number of query parameters (3 per location) under SQLite's limit
+# of 999
+GRID_CELL_UPDATE_BATCH_SIZE = 300
+
+
+class LocationManager(models.Manager):
+    """
+    Custom model manager for locations, with spatial queries backed by the indexed grid_cell column.
+    """
+    # Above this many cell ranges (roughly one per 0.1 degree of latitude) a plain latitude range scan is cheaper
+    MAX_GRID_CELL_RANGES = 200
+
+    def within_bounding_box(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """
+        QuerySet of locations within a bounding box.  A box with min_longitude > max_longitude crosses the
+        antimeridian.
+        """
+        queryset = self.filter(latitude__gte=min_latitude, latitude__lte=max_latitude)
+
+        cell_ranges = get_grid_cell_ranges(min_latitude, min_longitude, max_latitude, max_longitude)
+        if len(cell_ranges) <= self.MAX_GRID_CELL_RANGES:
+            in_grid_cells = Q()
+            for first_cell, last_cell in cell_ranges:
+                in_grid_cells |= Q(grid_cell__range=(first_cell, last_cell))
+            queryset = queryset.filter(in_grid_cells)
+
+        if min_longitude <= max_longitude:
+            return queryset.filter(longitude__gte=min_longitude, longitude__lte=max_longitude)
+        else:
+            return queryset.filter(Q(longitude__gte=min_longitude) | Q(longitude__lte=max_longitude))
+
+    def within_radius(self, latitude, longitude, radius):
+        """
+        Locations within radius km of a point.  Every location gets a distance attribute (in km).
+
+        :return: List of locations, closest first
+        """
+        locations = []
+
+        for location in self.within_bounding_box(*get_bounding_box(latitude, longitude, radius)):
+            location.distance = get_distance(latitude, longitude, location.latitude, location.longitude)
+            if location.distance <= radius:
+                locations.append(location)
+
+        return sorted(locations, key=attrgetter("distance"))
+
+    def nearest(self, latitude, longitude, count=1, initial_radius=10):
+        """
+        The count locations closest to a point (k-nearest neighbours).  The search radius starts at initial_radius km
+        and doubles until enough locations are found.  Every location gets a distance attribute (in km).
+
+        :return: List of locations, closest first
+        """
+        radius = initial_radius
+
+        while True:
+            locations = self.within_radius(latitude, longitude, radius)
+            # Half the circumference of the earth covers every location
+            if len(locations) >= count or radius >= math.pi * EARTH_RADIUS:
+                return locations[:count]
+            radius *= 2
+
+    def update_grid_cells(self, batch_size=GRID_CELL_UPDATE_BATCH_SIZE):
+        """
+        Set grid_cell of locations that don't have one, for locations created with bulk_create or update (which
+        don't call save).  Cells are computed by get_grid_cell and written with one UPDATE per batch.
+        """
+        while True:
+            locations = list(
+                self.filter(grid_cell__isnull=True).values_list("id", "latitude", "longitude")[:batch_size]
+            )
+            if not locations:
+                break
+
+            with transaction.atomic():
+                self.filter(pk__in=[location_id for location_id, latitude, longitude in locations]).update(
+                    grid_cell=Case(
+                        *[
+                            When(pk=location_id, then=Value(get_grid_cell(latitude, longitude)))
+                            for location_id, latitude, longitude in locations
+                        ],
+                        output_field=models.IntegerField()
+                    )
+                )
+
+
 class Location(models.Model):
     name = models.TextField()
     description = models.TextField(null=True, blank=True)
 
     latitude = models.DecimalField(decimal_places=4, max_digits=7)
     longitude = models.DecimalField(decimal_places=4, max_digits=7)
+    grid_cell = models.IntegerField(null=True, blank=True, db_index=True)  # Maintained in save(), see grid_cells.py
+
+    objects = LocationManager()
+
+    def save(self, *args, **kwargs):
+        self.grid_cell = get_grid_cell(self.latitude, self.longitude)
+        super(Location, self).save(*args, **kwargs)
 
     class Meta:
         db_table = "location"
@@ -268,6 +1667,31 @@ class Location(models.Model):
         verbose_name_plural = "Locations"
 
 
+class BaselineManager(RemoveDeletedManager):
+    """
+    Custom model manager for baselines.  Excludes deleted baselines.
+    """
+
+    def near(self, latitude, longitude, radius):
+        """
+        Baselines whose location is within radius km of a point.  Every baseline gets a distance attribute (in km).
+
+        :return: List of baselines, closest first
+        """
+        baselines = []
+        bounding_box = get_bounding_box(latitude, longitude, radius)
+
+        queryset = self.filter(location__in=Location.objects.within_bounding_box(*bounding_box))
+
+        for baseline in queryset.select_related("location"):
+            location = baseline.location
+            baseline.distance = get_distance(latitude, longitude, location.latitude, location.longitude)
+            if baseline.distance <= radius:
+                baselines.append(baseline)
+
+        return sorted(baselines, key=attrgetter("distance"))
+
+
 class Baseline(models.Model):
     name = models.TextField()
     description = models.TextField(null=True, blank=True)
@@ -280,7 +1704,7 @@ class Baseline(models.Model):
     deletion_timestamp = models.DateTimeField(null=True, blank=True)
 
     all_objects = models.Manager()  # Default manager - will include deleted as well
-    objects = RemoveDeletedManager()  # Override default manager to exclude deleted
+    objects = BaselineManager()  # Override default manager to exclude deleted
 
     @property
     def version(self):
@@ -288,5 +1712,33 @@ class Baseline(models.Model):
 
     class Meta:
         db_table = "baseline"
+        index_together = [("simulation", "deletion_timestamp"), ("location", "deletion_timestamp")]
         verbose_name = "Baseline"
-        verbose_name_plural = "Baselines"
\ No newline at end of file
+        verbose_name_plural = "Baselines"
+
+
+# Indexes covering only rows that are not deleted, which is what RemoveDeletedManager queries.  Django (as of 1.9) can't
+# declare partial indexes, so they are created after migrations on the backends that support them.
+PARTIAL_INDEXES = [
+    ("folder_live_owner_parent", "folder", "owner_id, parent_folder_id, sort_order"),
+    ("baseline_live_simulation", "baseline", "simulation_id"),
+    ("baseline_live_location", "baseline", "location_id"),
+]
+
+
+def create_partial_indexes(sender, app_config, using, **kwargs):
+    if app_config.name != "website" or connections[using].vendor not in ("sqlite", "postgresql"):
+        return
+
+    with connections[using].cursor() as cursor:
+        # Migrating backwards (or before the initial migration) can leave the tables missing
+        table_names = set(connections[using].introspection.table_names(cursor))
+        for index_name, table, columns in PARTIAL_INDEXES:
+            if table not in table_names:
+                continue
+            cursor.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s) WHERE deletion_timestamp IS NULL" % (
+                index_name, table, columns
+            ))
+
+
+post_migrate.connect(create_partial_indexes)
@@ -45,6 +45,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    # First, so its timings include all the other middleware
+    "website.middleware.PerformanceMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -96,6 +98,10 @@ TEMPLATES = [
     },
 ]
 
+# Production template mode: compile every template once per process with the cached loader instead of reading and
+# parsing it from disk on every render.  None means on when DEBUG is off (see the end of this file).
+TEMPLATE_CACHED_LOADER = None
+
 WSGI_APPLICATION = "wsgi.application"
 
 
@@ -182,14 +188,42 @@ LOGGING = {
     }
 }
 
+# Number of bytes read per chunk when hashing simulation files (see website.utils.md5_and_file_size)
+MD5_CHUNK_SIZE = 1024 * 1024
+
+# Size of the chunks simulation files are uploaded in (see website.models.SimulationFileUpload)
+CHUNKED_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# Largest file that can be uploaded in chunks, in bytes
+CHUNKED_UPLOAD_MAX_SIZE = 10 * 1024 * 1024 * 1024
+# Uploads that haven't received a chunk for this many days are deleted by the delete_stale_uploads command
+CHUNKED_UPLOAD_EXPIRY_DAYS = 7
+
+# Token the cluster uses to post simulation status updates, set it in settings_local.py
+# (see website.views.function_based.simulation_status)
+SIMULATION_STATUS_TOKEN = ""
+
+# Directory of the local change feed used to push simulation group progress to browsers
+# (see website.utils.change_feed).  Every open progress stream holds a worker for up to 25 seconds while it waits for
+# a change, so with more than a few dashboards open at a time the site needs threaded workers (for example
+# mod_wsgi's threads=, gunicorn --threads or --worker-class gevent) rather than one process per request.
+CHANGE_FEED_DIR = os.path.join(MEDIA_ROOT, "change_feed")
+
+# Requests taking longer than this many milliseconds are logged with their slowest queries
+# (see website.middleware.PerformanceMiddleware)
+SLOW_REQUEST_THRESHOLD = 1000
+
 # Database manager configuration
 DATABASE_MANAGER_DIR = os.path.join(MEDIA_ROOT, "databases")
+# Number of database backups kept in DATABASE_MANAGER_DIR/backups (see website.utils.database_backup)
+DATABASE_BACKUP_RETENTION = 14
 
 # https://pypi.python.org/pypi/django-crontab
 # django-crontab 0.6.0 settings
 # CRONJOBS = [
 #     # Run database backup every day at 4am server time
-#     ("0 4 * * *", "website.apps.database_manager.cron.backup_django_database")
+#     ("0 4 * * *", "website.cron.backup_django_database"),
+#     # Delete abandoned chunked uploads every day at 5am server time
+#     ("0 5 * * *", "website.cron.delete_stale_uploads"),
 # ]
 
 # This is the number of days users will have to activate their accounts after registering.
@@ -214,3 +248,14 @@ try:
     from settings_local import *
 except ImportError:
     pass
+
+# Done after importing settings_local so both DEBUG and TEMPLATE_CACHED_LOADER can be set there
+if TEMPLATE_CACHED_LOADER or (TEMPLATE_CACHED_LOADER is None and not DEBUG):
+    # Loaders and APP_DIRS can't be used together, the app_directories loader does what APP_DIRS did
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        ("django.template.loaders.cached.Loader", [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ]),
+    ]
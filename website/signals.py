@@ -2,6 +2,7 @@
 # All rights reserved
 
 from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
 from django.dispatch import receiver
 from registration.signals import user_activated
 
@@ -27,3 +28,14 @@ def user_activated_callback(sender, **kwargs):
     logger.debug("%s - New user has been activated", sender)
     # Send email to admins
 
+
+@receiver(connection_created)
+def use_wal_journal(sender, connection, **kwargs):
+    """
+    Put SQLite databases in WAL mode, in which readers (a running backup, see website.utils.database_backup) don't
+    block writers and writers don't block readers.  The mode is stored in the database file, so for every connection
+    after the first this is a no-op.
+    """
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
@@ -0,0 +1,212 @@
+// Chunked, resumable uploads of simulation files
+// Server side is in website/views/function_based/simulation_file_uploads.py
+
+var CHUNKED_UPLOAD_URL = "/simulation_files/uploads/";
+// Number of chunks sent at the same time
+var CHUNKED_UPLOAD_PARALLEL_CHUNKS = 4;
+// Number of times a chunk is retried after a network or server error before the upload is given up
+var CHUNKED_UPLOAD_MAX_RETRIES = 5;
+
+function get_csrf_token()
+{
+    var match = document.cookie.match(/(^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[2]) : "";
+}
+
+function get_upload_resume_key(file)
+{
+    return "chunked-upload:" + file.name + ":" + file.size + ":" + file.lastModified;
+}
+
+function create_chunked_upload(file)
+{
+    return $.ajax({
+        url: CHUNKED_UPLOAD_URL,
+        type: "POST",
+        data: {name: file.name, size: file.size},
+        headers: {"X-CSRFToken": get_csrf_token()}
+    }).then(function(upload)
+    {
+        if (window.localStorage)
+        {
+            localStorage.setItem(get_upload_resume_key(file), upload.id);
+        }
+        return upload;
+    });
+}
+
+function start_chunked_upload(file)
+{
+    // Resume an earlier upload of the same file if there is one the server still knows about
+    var upload_id = window.localStorage ? localStorage.getItem(get_upload_resume_key(file)) : null;
+
+    if (!upload_id)
+    {
+        return create_chunked_upload(file);
+    }
+
+    return $.ajax({url: CHUNKED_UPLOAD_URL + upload_id + "/", type: "GET"}).then(
+        function(upload)
+        {
+            return upload;
+        },
+        function()
+        {
+            localStorage.removeItem(get_upload_resume_key(file));
+            return create_chunked_upload(file);
+        }
+    );
+}
+
+function send_chunk(upload, file, index, attempt)
+{
+    var start = index * upload.chunk_size;
+
+    return $.ajax({
+        url: CHUNKED_UPLOAD_URL + upload.id + "/chunks/" + index + "/",
+        type: "PUT",
+        data: file.slice(start, Math.min(start + upload.chunk_size, file.size)),
+        processData: false,
+        contentType: "application/octet-stream",
+        headers: {"X-CSRFToken": get_csrf_token()}
+    }).then(null, function(xhr)
+    {
+        // Client errors won't go away by sending the same chunk again
+        if (attempt >= CHUNKED_UPLOAD_MAX_RETRIES || (xhr.status >= 400 && xhr.status < 500))
+        {
+            return $.Deferred().reject(xhr).promise();
+        }
+
+        // Back off exponentially so a server that is restarting or a dropped connection has time to come back
+        var retry = $.Deferred();
+        setTimeout(function()
+        {
+            send_chunk(upload, file, index, attempt + 1).then(retry.resolve, retry.reject);
+        }, 1000 * Math.pow(2, attempt));
+        return retry.promise();
+    });
+}
+
+function upload_file_in_chunks(file, on_progress)
+{
+    // Returns a promise resolved with the upload's status once the simulation file has been created
+    var result = $.Deferred();
+
+    start_chunked_upload(file).done(function(upload)
+    {
+        var chunk_count = Math.ceil(file.size / upload.chunk_size);
+        var received_chunks = {};
+        var pending_chunks = [];
+        var active_chunks = 0;
+        var uploaded_bytes = 0;
+        var is_finishing = false;
+
+        $.each(upload.received_chunks, function(i, index)
+        {
+            received_chunks[index] = true;
+        });
+
+        for (var index = 0; index < chunk_count; index++)
+        {
+            if (received_chunks[index])
+            {
+                uploaded_bytes += Math.min(upload.chunk_size, file.size - index * upload.chunk_size);
+            }
+            else
+            {
+                pending_chunks.push(index);
+            }
+        }
+
+        function finish_upload()
+        {
+            $.ajax({
+                url: CHUNKED_UPLOAD_URL + upload.id + "/complete/",
+                type: "POST",
+                headers: {"X-CSRFToken": get_csrf_token()}
+            }).done(function(completed_upload)
+            {
+                if (window.localStorage)
+                {
+                    localStorage.removeItem(get_upload_resume_key(file));
+                }
+                result.resolve(completed_upload);
+            }).fail(function(xhr)
+            {
+                result.reject(xhr.responseJSON ? xhr.responseJSON.error : "Failed to complete the upload");
+            });
+        }
+
+        function send_next_chunk()
+        {
+            if (result.state() !== "pending" || is_finishing)
+            {
+                return;
+            }
+
+            if (pending_chunks.length === 0)
+            {
+                if (active_chunks === 0)
+                {
+                    is_finishing = true;
+                    finish_upload();
+                }
+                return;
+            }
+
+            var index = pending_chunks.shift();
+            active_chunks++;
+
+            send_chunk(upload, file, index, 0).done(function()
+            {
+                active_chunks--;
+                uploaded_bytes += Math.min(upload.chunk_size, file.size - index * upload.chunk_size);
+                if (on_progress)
+                {
+                    on_progress(file.size ? 100 * uploaded_bytes / file.size : 100);
+                }
+                send_next_chunk();
+            }).fail(function(xhr)
+            {
+                // The chunks received so far are kept, uploading the same file again resumes from here
+                result.reject(xhr.responseJSON ? xhr.responseJSON.error : "Upload interrupted, try again to resume");
+            });
+        }
+
+        for (var i = 0; i < CHUNKED_UPLOAD_PARALLEL_CHUNKS; i++)
+        {
+            send_next_chunk();
+        }
+    }).fail(function()
+    {
+        result.reject("Failed to start the upload");
+    });
+
+    return result.promise();
+}
+
+function upload_file_from_modal(modal_prefix)
+{
+    // Used by upload_ajax_modal.html when no custom upload function is given
+    var file = $("#" + modal_prefix + "-file")[0].files[0];
+    var progress_bar = $("#" + modal_prefix + "-progress .progress-bar");
+
+    if (!file)
+    {
+        return;
+    }
+
+    progress_bar.removeClass("progress-bar-danger");
+    $("#" + modal_prefix + "-progress").show();
+
+    upload_file_in_chunks(file, function(percent)
+    {
+        progress_bar.css("width", percent + "%").text(Math.floor(percent) + "%");
+    }).done(function()
+    {
+        location.reload();
+    }).fail(function(message)
+    {
+        progress_bar.addClass("progress-bar-danger").css("width", "100%").text(message);
+    });
+}
@@ -0,0 +1,16 @@
+// Live progress of a simulation group, pushed by the server as it changes
+// Server side is in website/views/function_based/simulation_group_progress.py
+
+// Call on_progress({status_counts: {...}, total: n}) every time the status counts of the group change.
+// Returns the EventSource, call its close() method to stop watching.
+function watch_simulation_group_progress(group_id, on_progress)
+{
+    // EventSource reconnects by itself when the server ends the stream, and resends the last event id so only changes
+    // made in the meantime are delivered
+    var source = new EventSource("/simulation_groups/" + group_id + "/progress/stream/");
+    source.addEventListener("progress", function(event)
+    {
+        on_progress(JSON.parse(event.data));
+    });
+    return source;
+}
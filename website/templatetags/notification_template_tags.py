@@ -3,10 +3,7 @@ from django.template import Context, Template
 
 register = template.Library()
 
-
-@register.simple_tag(takes_context=True)
-def notifications(context):
-    notifications_template = Template("""
+NOTIFICATIONS_TEMPLATE = """
  {% for notification in notifications %}
  <div class="container-fuild">
                 <div class="alert {{ notification.type }} text-center">
@@ -15,16 +12,31 @@ def notifications(context):
                 </div>
  </div>
 {% endfor %}
-""")
-    # Retrieve the session
-    try:  # try/except is needed for the server error (500) view to function
-        session = context["request"].session
-        if session.__contains__("notifications"):
-            notifications = session.pop("notifications")
-            template_context = Context({"notifications": notifications})
-            return notifications_template.render(template_context)
-        else:
-            template_context = Context({"notifications": []})
-            return notifications_template.render(template_context)
-    except:
-        pass
+"""
+
+# Compiled on first use and reused by every request.  Compiling at import time would need the template engine while
+# the engine is still loading this library.
+_notifications_template = None
+
+
+def get_notifications_template():
+    global _notifications_template
+    if _notifications_template is None:
+        _notifications_template = Template(NOTIFICATIONS_TEMPLATE)
+    return _notifications_template
+
+
+@register.simple_tag(takes_context=True)
+def notifications(context):
+    # There is no request (or no session) in the context of the server error (500) view
+    request = context.get("request")
+    session = getattr(request, "session", None)
+    if session is None:
+        return ""
+
+    notifications = session.pop("notifications", None)
+    # Most pages have no notifications, don't render anything for them
+    if not notifications:
+        return ""
+
+    return get_notifications_template().render(Context({"notifications": notifications}))
@@ -1,3 +1,618 @@
-from django.test import TestCase
+"""
+Tests of the core model operations and views.
 
-# Create your tests here.
+The performance tests run against data seeded at realistic volumes (large simulation groups, deep folder trees, many
+files) and assert a budget of queries and seconds, so an operation whose cost starts growing with the amount of data
+fails the build.  The other tests check behaviour that is easy to get subtly wrong (blob reference counting, byte
+ranges, chunked upload hashing).  Run them with
+    python manage.py test website
+Query budgets allow for SQLite splitting bulk inserts into batches (it takes at most 999 parameters per query).
+"""
+import hashlib
+import math
+import random
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import ProtectedError
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.functional import empty
+from django.utils.timezone import now
+from vecnet.simulation import sim_status
+
+from website.models import FOLDER_ITEM_MODELS, GRID_CELL_UPDATE_BATCH_SIZE, STATUS_UPDATE_BATCH_SIZE, Baseline, \
+    Folder, Location, ModelVersion, Simulation, SimulationFileBlob, SimulationFileUpload, SimulationGroup, \
+    SimulationGroupStatistics, SimulationInputFile, SimulationOutputFile, _upload_md5s, forget_stale_upload_md5s
+from website.utils.grid_cells import get_grid_cell
+from website.utils.md5_and_file_size import get_md5_and_file_size
+from website.views.function_based import simulation_group_progress
+from website.views.function_based.simulation_files import get_requested_range
+
+GROUP_SIZE = 2000
+FOLDER_TREE_DEPTH = 100
+FOLDER_TREE_WIDTH = 20
+OUTPUT_FILE_COUNT = 500
+LOCATION_COUNT = 5000
+
+
+class PerformanceTestCase(TestCase):
+    @contextmanager
+    def assertMaxQueries(self, maximum):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        self.assertLessEqual(
+            len(context), maximum,
+            "%s queries executed, at most %s expected:\n%s" % (
+                len(context), maximum, "\n".join(query["sql"] for query in context.captured_queries)
+            )
+        )
+
+    @contextmanager
+    def assertFasterThan(self, seconds):
+        start_time = time.time()
+        yield
+        elapsed = time.time() - start_time
+        self.assertLess(elapsed, seconds, "Took %.3f s, budget is %s s" % (elapsed, seconds))
+
+
+class TemporaryMediaRootMixin(object):
+    """
+    Store simulation files in a temporary directory, removed after the test case.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_root_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_root_override.enable()
+        # The default storage reads MEDIA_ROOT once, when it is first used
+        default_storage._wrapped = empty
+        super(TemporaryMediaRootMixin, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(TemporaryMediaRootMixin, cls).tearDownClass()
+        cls.media_root_override.disable()
+        default_storage._wrapped = empty
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class SimulationPerformanceTests(TemporaryMediaRootMixin, PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("simulations", password="password")
+        cls.version = ModelVersion.objects.create(number="1.0")
+        cls.group = SimulationGroup.objects.submit(cls.user, [
+            {"version": cls.version, "command_line_arguments": "--run %s" % i} for i in range(GROUP_SIZE)
+        ])
+        cls.simulations = list(cls.group.simulations.order_by("id"))
+
+        simulations = random.Random(0).sample(cls.simulations, OUTPUT_FILE_COUNT)
+        cls.output_files = [
+            SimulationOutputFile.objects.create_file("output of %s" % simulation.id, name="output.txt",
+                                                     simulation=simulation)
+            for simulation in simulations
+        ]
+
+    def test_submit(self):
+        batch_count = int(math.ceil(GROUP_SIZE / 100.0))
+        with self.assertMaxQueries(20 + 2 * batch_count), self.assertFasterThan(5):
+            group = SimulationGroup.objects.submit(self.user, [{"version": self.version}] * GROUP_SIZE)
+        self.assertEqual(group.get_progress(), (0, GROUP_SIZE))
+
+    def test_copy(self):
+        simulation = self.output_files[0].simulation
+        with self.assertMaxQueries(20), self.assertFasterThan(0.5):
+            simulation_copy = simulation.copy(should_include_output=True)
+        self.assertEqual(simulation_copy.output_files.count(), 1)
+
+    def test_copy_group(self):
+        batch_count = int(math.ceil(GROUP_SIZE / 100.0))
+        with self.assertMaxQueries(20 + 3 * batch_count), self.assertFasterThan(10):
+            copies = Simulation.objects.copy_simulations(
+                self.group.simulations.all(), self.user, should_include_output=True
+            )
+        self.assertEqual(len(copies), GROUP_SIZE)
+        self.assertEqual(SimulationOutputFile.objects.filter(simulation__in=copies).count(), OUTPUT_FILE_COUNT)
+
+    def test_delete_group(self):
+        group = SimulationGroup.objects.submit(self.user, [{"version": self.version}] * GROUP_SIZE)
+        # Rows are deleted in batches; status counts updated simulation by simulation would take GROUP_SIZE queries
+        with self.assertMaxQueries(50), self.assertFasterThan(5):
+            group.delete()
+        self.assertFalse(Simulation.objects.filter(group=group).exists())
+
+    def test_delete_simulations(self):
+        group = SimulationGroup.objects.submit(self.user, [{"version": self.version}] * GROUP_SIZE)
+        tenth_id = group.simulations.order_by("id")[9].id
+        with self.assertMaxQueries(50), self.assertFasterThan(5):
+            group.simulations.filter(id__gt=tenth_id).delete()
+        self.assertEqual(group.get_status_counts(), {sim_status.READY_TO_RUN: 10})
+
+    def test_status_counts(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.group.get_status_counts(), {sim_status.READY_TO_RUN: GROUP_SIZE})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.group.get_progress(), (0, GROUP_SIZE))
+
+    def test_apply_status_updates(self):
+        start_timestamp = now()
+        updates = [
+            {"id": simulation.id, "status": sim_status.SCRIPT_DONE, "execution_start_timestamp": start_timestamp,
+             "execution_end_timestamp": start_timestamp + timedelta(seconds=simulation.id % 100)}
+            for simulation in self.simulations
+        ]
+        batch_count = int(math.ceil(GROUP_SIZE / float(STATUS_UPDATE_BATCH_SIZE)))
+        with self.assertMaxQueries(10 * batch_count), self.assertFasterThan(10):
+            self.assertEqual(Simulation.objects.apply_status_updates(updates), GROUP_SIZE)
+        self.assertEqual(self.group.get_progress(), (GROUP_SIZE, GROUP_SIZE))
+
+    def test_execution_statistics(self):
+        with self.assertMaxQueries(2), self.assertFasterThan(2):
+            self.group.get_execution_statistics()
+
+
+class SimulationFilePerformanceTests(TemporaryMediaRootMixin, PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("files", password="password")
+        version = ModelVersion.objects.create(number="1.0")
+        cls.group = SimulationGroup.objects.submit(cls.user, [{"version": version}] * GROUP_SIZE)
+        simulations = list(cls.group.simulations.all())
+
+        cls.shared_file = SimulationInputFile.objects.create_file("shared", name="shared.txt", created_by=cls.user)
+        cls.shared_file.simulations.add(*simulations)
+        cls.own_file = SimulationInputFile.objects.create_file("own", name="own.txt", created_by=cls.user)
+        cls.own_file.simulations.add(simulations[0])
+
+    def test_set_contents(self):
+        with self.assertMaxQueries(20), self.assertFasterThan(0.5):
+            self.own_file.set_contents("new contents")
+
+    def test_set_contents_of_shared_file(self):
+        # Finding out the file is shared must not load every simulation using it
+        with self.assertNumQueries(1):
+            self.assertRaises(RuntimeError, self.shared_file.set_contents, "new contents")
+
+    def test_download_not_modified(self):
+        self.client.force_login(self.user)
+        url = reverse("website.download_simulation_file", args=["input", self.own_file.id])
+
+        # Session, user and file
+        with self.assertMaxQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"%s"' % self.own_file.md5)
+        self.assertEqual(response.status_code, 304)
+
+
+class FolderPerformanceTests(PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("folders", password="password")
+        # A chain of FOLDER_TREE_DEPTH folders, each with FOLDER_TREE_WIDTH empty subfolders
+        cls.root_folder = parent_folder = Folder.objects.create(name="Root", owner=cls.user, sort_order=0)
+        for depth in range(FOLDER_TREE_DEPTH):
+            Folder.objects.bulk_create([
+                Folder(name="Leaf %s" % i, owner=cls.user, parent_folder=parent_folder, sort_order=i)
+                for i in range(FOLDER_TREE_WIDTH)
+            ])
+            parent_folder = Folder.objects.create(
+                name="Level %s" % depth, owner=cls.user, parent_folder=parent_folder, sort_order=FOLDER_TREE_WIDTH
+            )
+        cls.leaf_folder = parent_folder
+
+    def test_is_empty(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(self.root_folder.is_empty)
+        # Subfolders, then items of every kind
+        with self.assertNumQueries(1 + len(FOLDER_ITEM_MODELS)):
+            self.assertTrue(self.leaf_folder.is_empty)
+
+    def test_get_tree(self):
+        with self.assertNumQueries(1 + len(FOLDER_ITEM_MODELS)), self.assertFasterThan(2):
+            root_folders = Folder.objects.get_tree(self.user)
+        self.assertEqual(len(root_folders), 1)
+        self.assertEqual(root_folders[0].subfolder_count, FOLDER_TREE_WIDTH + 1)
+
+    def test_delete_subtree(self):
+        # Check and update, plus the savepoint of the transaction
+        with self.assertMaxQueries(4), self.assertFasterThan(2):
+            self.root_folder.delete_subtree()
+        self.assertFalse(Folder.objects.filter(owner=self.user).exists())
+
+
+class LocationPerformanceTests(PerformanceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generator = random.Random(0)
+        Location.objects.bulk_create([
+            Location(name="Location %s" % i, latitude="%.4f" % generator.uniform(-60, 60),
+                     longitude="%.4f" % generator.uniform(-180, 180))
+            for i in range(LOCATION_COUNT)
+        ])
+        Location.objects.update_grid_cells()
+
+    def test_update_grid_cells(self):
+        Location.objects.update(grid_cell=None)
+        # Read, savepoint, update and release per batch
+        batch_count = int(math.ceil(LOCATION_COUNT / float(GRID_CELL_UPDATE_BATCH_SIZE)))
+        with self.assertMaxQueries(4 * batch_count + 1), self.assertFasterThan(5):
+            Location.objects.update_grid_cells()
+        for location in Location.objects.all():
+            self.assertEqual(location.grid_cell, get_grid_cell(location.latitude, location.longitude))
+
+    def test_within_radius(self):
+        with self.assertNumQueries(1), self.assertFasterThan(0.5):
+            Location.objects.within_radius(0, 0, 500)
+
+    def test_near_a_location(self):
+        # Coordinates of a location are Decimals
+        location = Location.objects.order_by("id")[0]
+        self.assertEqual(Location.objects.nearest(location.latitude, location.longitude)[0], location)
+
+        user = User.objects.create(username="baselines")
+        simulation = Simulation.objects.create(
+            group=SimulationGroup.objects.create(submitted_by=user), version=ModelVersion.objects.create(number="1.0")
+        )
+        baseline = Baseline.objects.create(name="Baseline", simulation=simulation, location=location)
+        self.assertEqual(Baseline.objects.near(location.latitude, location.longitude, 10), [baseline])
+
+    def test_nearest(self):
+        # The search radius doubles from 10 km, a handful of rounds is enough to find one of thousands of locations
+        with self.assertMaxQueries(10), self.assertFasterThan(1):
+            self.assertEqual(len(Location.objects.nearest(10, 10, count=5)), 5)
+
+
+class SimulationFileBlobTests(TemporaryMediaRootMixin, TransactionTestCase):
+    """
+    Reference counting of the blob store.  Files are only deleted once the transaction releasing their blob commits,
+    so these tests run outside of a test transaction.
+    """
+    def test_same_contents_share_a_blob(self):
+        first_file = SimulationOutputFile.objects.create_file("contents", name="first.txt")
+        second_file = SimulationOutputFile.objects.create_file("contents", name="second.txt")
+
+        self.assertEqual(first_file.blob_id, second_file.blob_id)
+        self.assertEqual(SimulationFileBlob.objects.get().reference_count, 2)
+        self.assertEqual(second_file.get_contents(), b"contents")
+
+    def test_blob_is_deleted_with_its_last_file(self):
+        first_file = SimulationOutputFile.objects.create_file("contents", name="first.txt")
+        second_file = SimulationOutputFile.objects.create_file("contents", name="second.txt")
+        name = first_file.blob.file.name
+
+        first_file.delete()
+        self.assertEqual(SimulationFileBlob.objects.get().reference_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        second_file.delete()
+        self.assertFalse(SimulationFileBlob.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_set_contents_releases_the_old_blob(self):
+        simulation_file = SimulationOutputFile.objects.create_file("old", name="file.txt")
+        old_name = simulation_file.blob.file.name
+
+        simulation_file._set_contents("new")
+        self.assertEqual(list(SimulationFileBlob.objects.values_list("md5", flat=True)), [simulation_file.md5])
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(simulation_file.get_contents(), b"new")
+
+    def test_copy_shares_the_blob(self):
+        simulation_file = SimulationOutputFile.objects.create_file("contents", name="file.txt")
+        simulation_file_copy = simulation_file.copy()
+
+        self.assertEqual(simulation_file_copy.blob_id, simulation_file.blob_id)
+        self.assertEqual(SimulationFileBlob.objects.get().reference_count, 2)
+
+    def test_copy_of_file_without_blob(self):
+        # Files saved before the blob store existed have no blob
+        name = default_storage.save("legacy.txt", ContentFile(b"legacy contents"))
+        simulation_file = SimulationOutputFile.objects.create(name="legacy.txt", file=name, md5="", size=15)
+
+        simulation_file_copy = simulation_file.copy()
+        self.assertIsNotNone(simulation_file.blob_id)
+        self.assertEqual(simulation_file_copy.blob_id, simulation_file.blob_id)
+        self.assertEqual(simulation_file_copy.get_contents(), b"legacy contents")
+        self.assertEqual(SimulationFileBlob.objects.get().reference_count, 2)
+
+    def test_file_of_stored_again_contents_is_kept(self):
+        simulation_file = SimulationOutputFile.objects.create_file("contents", name="file.txt")
+        blob = simulation_file.blob
+
+        # The contents have been stored again by the time the released blob's file would be deleted
+        SimulationFileBlob.objects._delete_unused_file(blob.md5, blob.file.name)
+        self.assertTrue(default_storage.exists(blob.file.name))
+        self.assertEqual(SimulationFileBlob.objects.count(), 1)
+
+    def test_drifted_reference_count_keeps_files(self):
+        simulation_file = SimulationOutputFile.objects.create_file("contents", name="file.txt")
+        simulation_file.copy()
+        # Files inserted without acquiring their blob, for example
+        SimulationFileBlob.objects.update(reference_count=1)
+
+        self.assertRaises(ProtectedError, simulation_file.delete)
+        self.assertEqual(SimulationOutputFile.objects.count(), 2)
+        self.assertTrue(default_storage.exists(simulation_file.blob.file.name))
+
+    def test_open_contents_buffer(self):
+        simulation_file = SimulationOutputFile.objects.create_file("0123456789", name="file.txt")
+        with simulation_file.open_contents_buffer() as contents:
+            self.assertEqual(len(contents), 10)
+            self.assertEqual(bytes(contents[2:5]), b"234")
+
+        empty_file = SimulationOutputFile.objects.create_file("", name="empty.txt")
+        with empty_file.open_contents_buffer() as contents:
+            self.assertEqual(bytes(contents[0:5]), b"")
+
+    def test_acquiring_released_blob_fails(self):
+        simulation_file = SimulationOutputFile.objects.create_file("contents", name="file.txt")
+        blob = simulation_file.blob
+        simulation_file.delete()
+
+        self.assertRaises(SimulationFileBlob.DoesNotExist, SimulationFileBlob.objects.acquire, blob)
+
+
+class SimulationFileUploadTests(TemporaryMediaRootMixin, TestCase):
+    CHUNK_SIZE = 4
+
+    def setUp(self):
+        super(SimulationFileUploadTests, self).setUp()
+        # Upload ids are reused after the rollback of every test
+        _upload_md5s.clear()
+        self.user = User.objects.create(username="uploader")
+        self.contents = b"".join(b"%02d" % i for i in range(21))  # 42 bytes, the last chunk is short
+        self.upload = SimulationFileUpload.objects.create_upload(
+            "upload.txt", len(self.contents), self.user, chunk_size=self.CHUNK_SIZE
+        )
+
+    def write_chunk(self, index):
+        self.upload.write_chunk(index, self.contents[index * self.CHUNK_SIZE:(index + 1) * self.CHUNK_SIZE])
+
+    def assertCompletes(self):
+        simulation_file = self.upload.complete(created_by=self.user)
+        self.assertEqual(simulation_file.md5, hashlib.md5(self.contents).hexdigest())
+        self.assertEqual(simulation_file.get_contents(), self.contents)
+
+    def test_chunks_in_order(self):
+        for index in range(self.upload.get_chunk_count()):
+            self.write_chunk(index)
+        self.assertEqual(self.upload.hashed_size, len(self.contents))
+        self.assertCompletes()
+
+    def test_chunks_out_of_order(self):
+        indexes = list(range(self.upload.get_chunk_count()))
+        random.Random(0).shuffle(indexes)
+        indexes.remove(0)
+        for index in [indexes.pop()] + [0] + indexes:
+            self.write_chunk(index)
+        self.assertEqual(self.upload.hashed_size, len(self.contents))
+        self.assertCompletes()
+
+    def test_resumed_in_another_process(self):
+        for index in range(5):
+            self.write_chunk(index)
+        self.assertEqual(self.upload.hashed_size, 5 * self.CHUNK_SIZE)
+
+        # Another process (or this one after a restart) has no md5 to continue
+        _upload_md5s.clear()
+        for index in reversed(range(5, self.upload.get_chunk_count())):
+            self.write_chunk(index)
+        self.assertEqual(self.upload.hashed_size, 5 * self.CHUNK_SIZE)
+        self.assertCompletes()
+
+    def test_chunk_sent_again(self):
+        for index in [0, 1, 1, 2, 0] + list(range(3, self.upload.get_chunk_count())):
+            self.write_chunk(index)
+        self.assertCompletes()
+
+
+    @override_settings(CHUNKED_UPLOAD_MAX_SIZE=100)
+    def test_size_limit(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("website.create_simulation_file_upload"), {"name": "big.txt", "size": 101})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(SimulationFileUpload.objects.count(), 1)
+
+    def test_delete_stale(self):
+        self.write_chunk(0)
+        self.assertEqual(SimulationFileUpload.objects.delete_stale(), 0)
+
+        SimulationFileUpload.objects.update(last_modified_timestamp=now() - timedelta(days=8))
+        self.assertEqual(SimulationFileUpload.objects.delete_stale(), 1)
+        self.assertFalse(SimulationFileUpload.objects.exists())
+        self.assertFalse(default_storage.exists("uploads/%s.part" % self.upload.id))
+        self.assertNotIn(self.upload.id, _upload_md5s)
+
+    def test_stale_md5_is_forgotten(self):
+        self.write_chunk(0)
+        md5, hashed_size, last_used = _upload_md5s[self.upload.pk]
+        _upload_md5s[self.upload.pk] = (md5, hashed_size, last_used - 8 * 24 * 3600)
+
+        forget_stale_upload_md5s()
+        self.assertNotIn(self.upload.pk, _upload_md5s)
+        for index in range(1, self.upload.get_chunk_count()):
+            self.write_chunk(index)
+        self.assertCompletes()
+
+@override_settings(SIMULATION_STATUS_TOKEN="")
+class SimulationStatusUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("staff", password="password", is_staff=True)
+        cls.simulation = Simulation.objects.create(
+            group=SimulationGroup.objects.create(submitted_by=cls.user),
+            version=ModelVersion.objects.create(number="1.0"),
+        )
+
+    def post(self, body, client=None):
+        client = client or self.client
+        client.login(username="staff", password="password")
+        return client.post(reverse("website.ingest_simulation_status_updates"), body, content_type="application/json")
+
+    def test_update(self):
+        response = self.post('{"id": %s, "status": "%s"}\n' % (self.simulation.id, sim_status.SCRIPT_DONE))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Simulation.objects.get().status, sim_status.SCRIPT_DONE)
+
+    def test_session_without_csrf_token_is_rejected(self):
+        response = self.post('{"id": %s, "status": "%s"}\n' % (self.simulation.id, sim_status.SCRIPT_DONE),
+                             Client(enforce_csrf_checks=True))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Simulation.objects.get().status, sim_status.READY_TO_RUN)
+
+    def test_invalid_updates_are_rejected(self):
+        for line in ('{"id": "abc"}', '{"id": null}', '{"id": true}', '{"id": 1, "status": 5}',
+                     '{"id": 1, "status": "running"}', '{"id": 1, "status": "much too long"}',
+                     '{"id": 1, "execution_start_timestamp": 5}', '{"id": 1, "execution_end_timestamp": "x"}'):
+            self.assertEqual(self.post(line).status_code, 400, line)
+
+
+class SimulationGroupRollupTests(TestCase):
+    """
+    The status counts and execution statistics of a group follow every way its simulations change.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username="rollups")
+        cls.group = SimulationGroup.objects.create(submitted_by=user)
+        cls.version = ModelVersion.objects.create(number="1.0")
+        cls.simulation = Simulation.objects.create(group=cls.group, version=cls.version)
+        SimulationGroupStatistics.objects.refresh([cls.group.id])
+
+    def finish(self, simulation, seconds):
+        simulation.execution_start_timestamp = now()
+        simulation.execution_end_timestamp = simulation.execution_start_timestamp + timedelta(seconds=seconds)
+        simulation.status = sim_status.SCRIPT_DONE
+        simulation.save()
+
+    def get_statistics(self):
+        return SimulationGroupStatistics.objects.get(group=self.group).as_dict()
+
+    def test_saving_stale_simulation_keeps_counts(self):
+        simulation = Simulation.objects.get()
+        Simulation.objects.apply_status_updates([{"id": simulation.id, "status": sim_status.SCRIPT_DONE}])
+
+        # The loaded simulation still has the old status, the counts must not subtract it twice
+        simulation.status = sim_status.SCRIPT_ERROR
+        simulation.save()
+        self.assertEqual(self.group.get_status_counts(), {sim_status.SCRIPT_ERROR: 1})
+
+    def test_save_updates_statistics(self):
+        self.finish(Simulation.objects.get(), 10)
+        self.assertEqual((self.get_statistics()["count"], self.get_statistics()["max"]), (1, 10))
+
+        self.finish(Simulation.objects.get(), 30)
+        self.assertEqual((self.get_statistics()["count"], self.get_statistics()["mean"]), (1, 30))
+
+    def test_delete_updates_statistics(self):
+        self.finish(Simulation.objects.get(), 10)
+        self.finish(Simulation.objects.create(group=self.group, version=self.version), 20)
+        self.assertEqual(self.get_statistics()["count"], 2)
+
+        Simulation.objects.filter(pk=self.simulation.pk).delete()
+        self.assertEqual((self.get_statistics()["count"], self.get_statistics()["mean"]), (1, 20))
+        self.assertEqual(self.group.get_status_counts(), {sim_status.SCRIPT_DONE: 1})
+
+
+class Md5AndFileSizeTests(TestCase):
+    def test_extra_positional_arguments_go_to_the_callback(self):
+        calls = []
+        contents = b"x" * 100
+        md5, size = get_md5_and_file_size(BytesIO(contents), len(contents), lambda *args: calls.append(args), 42,
+                                          chunk_size=10)
+        self.assertEqual((md5, size), (hashlib.md5(contents).hexdigest(), 100))
+        self.assertTrue(calls)
+        self.assertTrue(all(args[1:] == (42,) for args in calls))
+
+
+class SimulationFileDownloadTests(TemporaryMediaRootMixin, TestCase):
+    CONTENTS = b"0123456789"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("staff", password="password", is_staff=True)
+        cls.simulation_file = SimulationOutputFile.objects.create_file(cls.CONTENTS, name="file.txt")
+        cls.etag = '"%s"' % cls.simulation_file.md5
+
+    def download(self, **headers):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("website.download_simulation_file", args=["output", self.simulation_file.id]), **headers
+        )
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_get_requested_range(self):
+        for range_header, expected_range in (
+            ("bytes=0-4", (0, 5)),
+            ("bytes=5-", (5, 5)),
+            ("bytes=8-100", (8, 2)),  # Clipped to the end of the file
+            ("bytes=-3", (7, 3)),
+            ("bytes=-20", (0, 10)),
+            ("bytes=10-", False),  # Starts past the end
+            ("bytes=-0", False),
+            ("bytes=5-2", None),  # Invalid, the whole file is served
+            ("bytes=-", None),
+            ("bytes=0-1,3-4", None),  # Multiple ranges aren't supported
+            ("items=0-4", None),
+        ):
+            self.assertEqual(get_requested_range(range_header, len(self.CONTENTS)), expected_range, range_header)
+
+    def test_range(self):
+        response, contents = self.download(HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(contents, b"2345")
+
+    def test_unsatisfiable_range(self):
+        response, contents = self.download(HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_if_range(self):
+        response, contents = self.download(HTTP_RANGE="bytes=-3", HTTP_IF_RANGE=self.etag)
+        self.assertEqual((response.status_code, contents), (206, b"789"))
+
+        # The file changed since the client started downloading it, so it gets the whole file
+        response, contents = self.download(HTTP_RANGE="bytes=-3", HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, contents), (200, self.CONTENTS))
+
+
+class SimulationGroupProgressStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("progress", password="password")
+        cls.group = SimulationGroup.objects.submit(cls.user, [{"version": ModelVersion.objects.create(number="1.0")}])
+        cls.url = reverse("website.simulation_group_progress_stream", args=[cls.group.id])
+
+    def stream(self, **headers):
+        response = self.client.get(self.url, **headers)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_login_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_long_poll(self):
+        self.client.force_login(self.user)
+        # The first request gets the current progress at once
+        events = self.stream()
+        self.assertIn("event: progress", events)
+        last_event_id = re.search(r"^id: (.*)$", events, re.MULTILINE).group(1)
+
+        # Reconnecting with the id of that event waits for a change, and ends without an event if there is none
+        original_timeout = simulation_group_progress.LONG_POLL_TIMEOUT
+        simulation_group_progress.LONG_POLL_TIMEOUT = 0.1
+        try:
+            self.assertNotIn("event: progress", self.stream(HTTP_LAST_EVENT_ID=last_event_id))
+        finally:
+            simulation_group_progress.LONG_POLL_TIMEOUT = original_timeout
@@ -5,7 +5,16 @@ from django.views.generic.base import TemplateView
 
 from django.contrib.auth import views
 
+from website.views.function_based.request_statistics import view_request_statistics
+from website.views.function_based.simulation_file_uploads import complete_simulation_file_upload, \
+    create_simulation_file_upload, simulation_file_upload_status, upload_simulation_file_chunk
+from website.views.function_based.simulation_files import download_simulation_file
+from website.views.function_based.simulation_group_progress import simulation_group_progress_stream
+from website.views.function_based.simulation_status import ingest_simulation_status_updates
+
 urlpatterns = [
+    # Before the admin URLs, which would take any other admin/ URL
+    url(r"^admin/request_statistics/$", view_request_statistics, name="website.request_statistics"),
     url(r"^admin/", include(admin.site.urls)),
     url(r"^$", TemplateView.as_view(template_name="index.html"), name="index"),
     url(r"^credits/$", TemplateView.as_view(template_name="credits.html"), name="credits"),
@@ -25,6 +34,21 @@ urlpatterns = [
         views.password_reset_confirm, name="password_reset_confirm"),
     url(r"^reset/done/$", views.password_reset_complete, name="password_reset_complete"),
 
+    url(r"^simulation_files/(?P<file_type>input|output)/(?P<file_id>\d+)/download/$", download_simulation_file,
+        name="website.download_simulation_file"),
+    url(r"^simulation_files/uploads/$", create_simulation_file_upload, name="website.create_simulation_file_upload"),
+    url(r"^simulation_files/uploads/(?P<upload_id>\d+)/$", simulation_file_upload_status,
+        name="website.simulation_file_upload_status"),
+    url(r"^simulation_files/uploads/(?P<upload_id>\d+)/chunks/(?P<index>\d+)/$", upload_simulation_file_chunk,
+        name="website.upload_simulation_file_chunk"),
+    url(r"^simulation_files/uploads/(?P<upload_id>\d+)/complete/$", complete_simulation_file_upload,
+        name="website.complete_simulation_file_upload"),
+
+    url(r"^simulation_groups/(?P<group_id>\d+)/progress/stream/$", simulation_group_progress_stream,
+        name="website.simulation_group_progress_stream"),
+    url(r"^simulations/status_updates/$", ingest_simulation_status_updates,
+        name="website.ingest_simulation_status_updates"),
+
     # django-registration-redux URLs
     # https://django-registration-redux.readthedocs.org/en/latest/quickstart.html#setting-up-urls
 #    url(r"^accounts/", include("registration.backends.default.urls")),
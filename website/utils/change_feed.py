@@ -0,0 +1,81 @@
+import os
+import re
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+
+
+class ChangeFeed(object):
+    """
+    Local change feed: publishers announce that something identified by a key changed, and waiters block until it
+    does.  Needs no outside services, so it works (and can be tested) anywhere.
+
+    Every key has a version, stored in a small file so every process on the machine shares it.  Publishing writes a new
+    unique version, so no change is ever missed because two publishers raced.  Waiters in the publishing process are
+    woken at once; waiters in other processes notice the new version within poll_interval seconds, by reading a tiny
+    file instead of querying the database.
+    """
+
+    def __init__(self, directory, poll_interval=0.5):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", str(key)))
+
+    def get_version(self, key):
+        """
+        :return: Current version of key, None if it was never published
+        """
+        try:
+            with open(self._get_path(key)) as version_file:
+                return version_file.read()
+        except IOError:
+            return None
+
+    def publish(self, key):
+        """
+        Announce that key changed.
+        """
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another process created the directory in the meantime
+                if not os.path.isdir(self.directory):
+                    raise
+
+        # Write then rename, so readers never see a partly written version
+        temporary_path = "%s.%s.tmp" % (self._get_path(key), uuid4().hex)
+        with open(temporary_path, "w") as version_file:
+            version_file.write("%.6f-%s" % (time.time(), uuid4().hex))
+        os.rename(temporary_path, self._get_path(key))
+
+        with self.condition:
+            self.condition.notify_all()
+
+    def wait(self, key, version, timeout):
+        """
+        Wait until the version of key is different from version, or until timeout seconds have passed.
+
+        :return: Current version of key
+        """
+        deadline = time.time() + timeout
+
+        while True:
+            current_version = self.get_version(key)
+            remaining = deadline - time.time()
+            if current_version != version or remaining <= 0:
+                return current_version
+
+            with self.condition:
+                self.condition.wait(min(self.poll_interval, remaining))
+
+
+# Published whenever the status counts of a simulation group change, keyed by group id
+simulation_group_changes = ChangeFeed(os.path.join(
+    getattr(settings, "CHANGE_FEED_DIR", os.path.join(settings.MEDIA_ROOT, "change_feed")), "simulation_groups"
+))
@@ -0,0 +1,162 @@
+"""
+Online, compressed backups of the Django database, written to DATABASE_MANAGER_DIR/backups.
+
+Backups are taken while the site is running:
+    SQLite - an SQL dump in one read transaction; the database is in WAL mode, so writers carry on meanwhile
+    PostgreSQL - pg_dump reads a consistent MVCC snapshot and takes no locks that block writers
+Either way the output is gzipped as it is produced, so the uncompressed dump never has to fit in memory or on disk.
+"""
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import subprocess
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.path.join(settings.DATABASE_MANAGER_DIR, "backups")
+# Number of backups kept, older ones are deleted after every successful backup
+BACKUP_RETENTION = getattr(settings, "DATABASE_BACKUP_RETENTION", 14)
+CHUNK_SIZE = 1024 * 1024
+MEGABYTE = 1024.0 * 1024.0
+
+
+def get_backup_name(reason, user):
+    safe = lambda value: re.sub(r"[^\w.-]", "_", str(value))
+    return "backup_%s_%s_%s" % (now().strftime("%Y%m%d_%H%M%S"), safe(reason), safe(user))
+
+
+def compress(source, destination_path):
+    """
+    gzip everything read from the file-like source into destination_path.
+
+    :return: Number of uncompressed bytes
+    """
+    size = 0
+    with gzip.open(destination_path, "wb") as destination:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return size
+            destination.write(chunk)
+            size += len(chunk)
+
+
+def backup_sqlite(database, backup_path):
+    """
+    Dump the database as SQL statements, gzipped as they are produced.
+
+    The dump runs in a single read transaction, so it is a consistent snapshot.  The database is in WAL mode (see
+    website.signals.use_wal_journal, made sure of here as well), so writers carry on while the dump runs; with a
+    rollback journal they would be locked out until it is done.  SQLite's backup API is not used: it restarts from
+    the first page whenever another connection writes between its steps, so on a busy database it may never finish,
+    and it needs an uncompressed copy of the database on disk to write to.  The price of a dump is that restoring it
+    means replaying the SQL, which is slower than putting a database file back.
+
+    :return: Number of uncompressed bytes written and the extension of the backup file
+    """
+    # Autocommit mode, so the transaction is the one started here and not one the sqlite3 module manages
+    source = sqlite3.connect(database["NAME"], isolation_level=None)
+    try:
+        source.execute("PRAGMA journal_mode=WAL")
+        source.execute("BEGIN")
+        size = 0
+        with gzip.open(backup_path, "wb") as destination:
+            for line in source.iterdump():
+                line = (line + "\n").encode("utf-8")
+                destination.write(line)
+                size += len(line)
+        return size, "sql.gz"
+    finally:
+        source.close()
+
+
+def backup_postgresql(database, backup_path):
+    """
+    :return: Number of uncompressed bytes written and the extension of the backup file
+    """
+    command = ["pg_dump", "--no-owner"]
+    if database.get("HOST"):
+        command += ["--host", database["HOST"]]
+    if database.get("PORT"):
+        command += ["--port", str(database["PORT"])]
+    if database.get("USER"):
+        command += ["--username", database["USER"]]
+    command.append(database["NAME"])
+
+    environment = dict(os.environ)
+    if database.get("PASSWORD"):
+        environment["PGPASSWORD"] = database["PASSWORD"]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment)
+    try:
+        size = compress(process.stdout, backup_path)
+    finally:
+        process.stdout.close()
+        errors = process.stderr.read()
+        process.wait()
+
+    if process.returncode:
+        raise RuntimeError("pg_dump failed: %s" % errors.decode("utf-8", "replace").strip())
+    return size, "sql.gz"
+
+
+def remove_old_backups(retention=None):
+    if retention is None:
+        retention = BACKUP_RETENTION
+    # Backup names start with their timestamp, so sorting by name sorts by age
+    backups = sorted(name for name in os.listdir(BACKUP_DIR) if name.startswith("backup_") and name.endswith(".gz"))
+    for name in backups[:max(len(backups) - retention, 0)]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+        logger.info("Removed old database backup %s", name)
+
+
+def backup(reason, user):
+    """
+    Back up the default database.
+
+    :param reason: Why the backup is made (for example "reset" or "cron"), becomes part of the file name
+    :param user: Who made the backup, becomes part of the file name
+    :return: True and a message with the backup's path, size and throughput if the backup succeeded; False and an
+             error message if it failed
+    """
+    database = connections.databases["default"]
+    engine = database["ENGINE"]
+    if engine == "django.db.backends.sqlite3":
+        backup_function = backup_sqlite
+    elif engine == "django.db.backends.postgresql_psycopg2" or engine == "django.db.backends.postgresql":
+        backup_function = backup_postgresql
+    else:
+        return False, "Unsupported database engine %s" % engine
+
+    if not os.path.exists(BACKUP_DIR):
+        os.makedirs(BACKUP_DIR)
+
+    # Written under a temporary name, so a failed or interrupted backup never looks like a complete one
+    partial_path = os.path.join(BACKUP_DIR, get_backup_name(reason, user) + ".partial")
+    start_time = time.time()
+    try:
+        size, extension = backup_function(database, partial_path)
+    except (EnvironmentError, RuntimeError, sqlite3.Error) as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        logger.error("Database backup failed: %s", e)
+        return False, str(e)
+
+    backup_path = partial_path[:-len(".partial")] + "." + extension
+    os.rename(partial_path, backup_path)
+    elapsed = time.time() - start_time
+    remove_old_backups()
+
+    message = "%s: %.1f MB (%.1f MB compressed) in %.1f s, %.1f MB/s" % (
+        backup_path, size / MEGABYTE, os.path.getsize(backup_path) / MEGABYTE, elapsed,
+        size / MEGABYTE / elapsed if elapsed else 0
+    )
+    logger.info("Database backup %s", message)
+    return True, message
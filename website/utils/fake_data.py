@@ -0,0 +1,314 @@
+"""
+Synthetic data at realistic volumes, to profile and run the benchmarks against (see the reset management command).
+
+Everything is generated from a seeded random number generator, so the same size and seed always produce the same
+data.  Rows are written with bulk inserts, one transaction per batch, and get explicit ids so related rows can be
+generated without reading anything back.  Generated rows bypass save(), so the status counts and statistics of the
+simulation groups are recomputed at the end.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils.timezone import now
+from vecnet.simulation import sim_status
+
+from website.models import Baseline, Folder, Location, ModelVersion, Simulation, SimulationFileBlob, SimulationGroup, \
+    SimulationGroupStatistics, SimulationGroupStatusCount, SimulationInputFile, SimulationOutputFile
+from website.utils.grid_cells import get_grid_cell
+
+SIZE_PRESETS = {
+    "small": {
+        "users": 10,
+        "model_versions": 3,
+        "groups": 20,
+        "simulations_per_group": 50,
+        "folders_per_user": 20,
+        "locations": 1000,
+        "baselines": 100,
+    },
+    "medium": {
+        "users": 100,
+        "model_versions": 10,
+        "groups": 200,
+        "simulations_per_group": 500,
+        "folders_per_user": 200,
+        "locations": 20000,
+        "baselines": 2000,
+    },
+    "prod": {
+        "users": 1000,
+        "model_versions": 20,
+        "groups": 1000,
+        "simulations_per_group": 2000,
+        "folders_per_user": 500,
+        "locations": 200000,
+        "baselines": 20000,
+    },
+}
+
+BATCH_SIZE = 10000
+# Number of distinct file contents; every generated file row shares one of them
+BLOB_COUNT = 20
+# Share of the simulations in every status, the rest is ready to run
+STATUS_SHARES = ((sim_status.SCRIPT_DONE, 0.7), (sim_status.RUNNING_MODEL, 0.1))
+FAKE_PASSWORD = "password"
+
+
+def get_next_id(model):
+    return (model._base_manager.aggregate(Max("id"))["id__max"] or 0) + 1
+
+
+def bulk_insert(model, rows, batch_size=BATCH_SIZE):
+    """
+    Insert rows (an iterable of model instances) in batches, each batch in its own transaction.
+
+    :return: Number of rows inserted
+    """
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            with transaction.atomic():
+                model._base_manager.bulk_create(batch)
+            count += len(batch)
+            batch = []
+
+    if batch:
+        with transaction.atomic():
+            model._base_manager.bulk_create(batch)
+        count += len(batch)
+
+    return count
+
+
+class FakeDataGenerator(object):
+    def __init__(self, size="small", seed=0, log=None):
+        """
+        :param size: Name of one of the SIZE_PRESETS
+        :param log: Function called with progress messages
+        """
+        self.sizes = SIZE_PRESETS[size]
+        self.random = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = now()
+
+    def populate(self):
+        users = self.create_users()
+        versions = self.create_model_versions()
+        blobs = self.create_blobs()
+        group_ids = self.create_simulation_groups(users, versions, blobs)
+        self.create_folders(users)
+        location_ids = self.create_locations()
+        self.create_baselines(group_ids, location_ids)
+        self.update_blob_reference_counts()
+        self.reset_sequences()
+
+    def create_users(self):
+        self.log("Creating %s users (password '%s')" % (self.sizes["users"], FAKE_PASSWORD))
+        # Hashing is deliberately slow, every user gets the same hash
+        password = make_password(FAKE_PASSWORD)
+        first_id = get_next_id(User)
+        bulk_insert(User, (
+            User(id=user_id, username="user%s" % user_id, email="user%s@example.com" % user_id, password=password)
+            for user_id in range(first_id, first_id + self.sizes["users"])
+        ))
+        return list(User.objects.filter(id__gte=first_id).order_by("id"))
+
+    def create_model_versions(self):
+        first_id = get_next_id(ModelVersion)
+        bulk_insert(ModelVersion, (
+            ModelVersion(id=version_id, number="%s.%s" % (version_id // 10 + 1, version_id % 10))
+            for version_id in range(first_id, first_id + self.sizes["model_versions"])
+        ))
+        return list(range(first_id, first_id + self.sizes["model_versions"]))
+
+    def create_blobs(self):
+        # Real files in storage, so generated simulation files can be downloaded and verified
+        blobs = []
+        for i in range(BLOB_COUNT):
+            line = "fake simulation file %s, line %%s\n" % i
+            blobs.append(SimulationFileBlob.objects.store(
+                line % line_number for line_number in range(self.random.randint(10, 10000))
+            ))
+        return blobs
+
+    def create_simulation_groups(self, users, versions, blobs):
+        group_count = self.sizes["groups"]
+        simulations_per_group = self.sizes["simulations_per_group"]
+        self.log("Creating %s simulation groups of %s simulations" % (group_count, simulations_per_group))
+
+        first_group_id = get_next_id(SimulationGroup)
+        simulation_id = get_next_id(Simulation)
+        input_file_id = get_next_id(SimulationInputFile)
+        output_file_id = get_next_id(SimulationOutputFile)
+        group_ids = list(range(first_group_id, first_group_id + group_count))
+
+        for group_id in group_ids:
+            user = self.random.choice(users)
+            submission_timestamp = self.now - timedelta(days=self.random.uniform(0, 365))
+            SimulationGroup.objects.create(
+                id=group_id, submitted_by=user, submission_timestamp=submission_timestamp,
+                start_timestamp=submission_timestamp
+            )
+
+            simulations = []
+            for i in range(simulations_per_group):
+                simulations.append(self.get_simulation(simulation_id, group_id, versions, submission_timestamp))
+                simulation_id += 1
+            bulk_insert(Simulation, simulations)
+
+            # One input file shared by the whole group and an output file for every finished simulation
+            blob = self.random.choice(blobs)
+            SimulationInputFile(
+                id=input_file_id, name="scenario.xml", file=blob.file.name, md5=blob.md5, size=blob.size, blob=blob,
+                created_by_id=user.id
+            ).save(force_insert=True)
+            through_model = SimulationInputFile.simulations.through
+            bulk_insert(through_model, (
+                through_model(simulation_id=simulation.id, simulationinputfile_id=input_file_id)
+                for simulation in simulations
+            ))
+            input_file_id += 1
+
+            output_files = []
+            for simulation in simulations:
+                if simulation.status == sim_status.SCRIPT_DONE:
+                    blob = self.random.choice(blobs)
+                    output_files.append(SimulationOutputFile(
+                        id=output_file_id, name="output.txt", file=blob.file.name, md5=blob.md5, size=blob.size,
+                        blob=blob, simulation_id=simulation.id
+                    ))
+                    output_file_id += 1
+            bulk_insert(SimulationOutputFile, output_files)
+
+            SimulationGroupStatusCount.objects.recount([group_id])
+            SimulationGroupStatistics.objects.refresh([group_id])
+            self.log("Simulation group %s/%s" % (group_id - first_group_id + 1, group_count))
+
+        return group_ids
+
+    def get_simulation(self, simulation_id, group_id, versions, submission_timestamp):
+        simulation = Simulation(
+            id=simulation_id, group_id=group_id, version_id=self.random.choice(versions),
+            command_line_arguments="--seed %s" % self.random.randint(0, 1000000), status=sim_status.READY_TO_RUN
+        )
+
+        share = self.random.random()
+        for status, status_share in STATUS_SHARES:
+            if share < status_share:
+                simulation.status = status
+                break
+            share -= status_share
+
+        if simulation.status != sim_status.READY_TO_RUN:
+            simulation.execution_start_timestamp = submission_timestamp + timedelta(
+                seconds=self.random.expovariate(1 / 600.0)
+            )
+        if simulation.status == sim_status.SCRIPT_DONE:
+            # Most simulations take minutes, a few take hours
+            simulation.execution_end_timestamp = simulation.execution_start_timestamp + timedelta(
+                seconds=self.random.lognormvariate(6, 1)
+            )
+        return simulation
+
+    def create_folders(self, users):
+        folders_per_user = self.sizes["folders_per_user"]
+        self.log("Creating %s folders for every user" % folders_per_user)
+        folder_id = get_next_id(Folder)
+
+        def get_folders():
+            folder_id_ = folder_id
+            for user in users:
+                user_folder_ids = []
+                for sort_order in range(folders_per_user):
+                    # About one folder in ten is at the top level, the others go into a random earlier folder
+                    parent_folder_id = None
+                    if user_folder_ids and self.random.random() > 0.1:
+                        parent_folder_id = self.random.choice(user_folder_ids)
+                    yield Folder(
+                        id=folder_id_, name="Folder %s" % folder_id_, owner=user, parent_folder_id=parent_folder_id,
+                        sort_order=sort_order,
+                        deletion_timestamp=self.now if self.random.random() < 0.05 else None
+                    )
+                    user_folder_ids.append(folder_id_)
+                    folder_id_ += 1
+
+        bulk_insert(Folder, get_folders())
+
+    def create_locations(self):
+        self.log("Creating %s locations" % self.sizes["locations"])
+        first_id = get_next_id(Location)
+
+        def get_locations():
+            for location_id in range(first_id, first_id + self.sizes["locations"]):
+                # Where people live, roughly: away from the poles
+                latitude = round(self.random.uniform(-55, 70), 4)
+                longitude = round(self.random.uniform(-180, 180), 4)
+                yield Location(
+                    id=location_id, name="Location %s" % location_id, latitude=latitude, longitude=longitude,
+                    grid_cell=get_grid_cell(latitude, longitude)
+                )
+
+        bulk_insert(Location, get_locations())
+        return list(range(first_id, first_id + self.sizes["locations"]))
+
+    def create_baselines(self, group_ids, location_ids):
+        self.log("Creating %s baselines" % self.sizes["baselines"])
+        first_id = get_next_id(Baseline)
+        simulation_ids = list(
+            Simulation.objects.filter(group_id__in=group_ids[:100], status=sim_status.SCRIPT_DONE).values_list(
+                "id", flat=True
+            )[:self.sizes["baselines"]]
+        )
+        if not simulation_ids:
+            return
+
+        bulk_insert(Baseline, (
+            Baseline(
+                id=baseline_id, name="Baseline %s" % baseline_id, simulation_id=self.random.choice(simulation_ids),
+                location_id=self.random.choice(location_ids)
+            )
+            for baseline_id in range(first_id, first_id + self.sizes["baselines"])
+        ))
+
+    def update_blob_reference_counts(self):
+        # Generated file rows didn't acquire their blobs
+        reference_counts = dict((blob_id, 0) for blob_id in SimulationFileBlob.objects.values_list("id", flat=True))
+        for model in (SimulationInputFile, SimulationOutputFile):
+            for blob_id, count in model.objects.filter(blob__isnull=False).order_by().values_list("blob").annotate(
+                    Count("id")):
+                reference_counts[blob_id] += count
+
+        with transaction.atomic():
+            for blob_id, reference_count in reference_counts.items():
+                SimulationFileBlob.objects.filter(id=blob_id).update(reference_count=reference_count)
+
+    @staticmethod
+    def reset_sequences():
+        # Rows were inserted with explicit ids, which doesn't advance PostgreSQL's sequences
+        statements = connection.ops.sequence_reset_sql(no_style(), [
+            User, ModelVersion, SimulationGroup, Simulation, SimulationInputFile, SimulationOutputFile, Folder,
+            Location, Baseline,
+        ])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+
+def populate(size="small", seed=0, log=None):
+    """
+    Fill the database with generated data.  Can be called on a database that already has data; ids continue after
+    the existing ones.
+
+    :param size: Name of one of the SIZE_PRESETS
+    :param seed: Seed of the random number generator
+    :param log: Function called with progress messages
+    """
+    FakeDataGenerator(size, seed, log).populate()
@@ -0,0 +1,89 @@
+"""
+Helpers for indexing locations on a fixed latitude/longitude grid.  Every location is assigned to the grid cell it is in,
+and the cell number is stored in an indexed column, so spatial queries turn into a few range scans on that index.  This
+works on any database, no spatial extension required.
+
+Cells are numbered row by row, starting at the south pole and the antimeridian, so the cells of one row within a range
+of longitudes have consecutive numbers.
+"""
+import math
+
+EARTH_RADIUS = 6371.0088  # Mean radius in km
+KM_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+GRID_CELL_SIZE = 0.1  # In degrees, roughly 11 km of latitude
+GRID_ROWS = int(round(180 / GRID_CELL_SIZE))
+GRID_COLUMNS = int(round(360 / GRID_CELL_SIZE))
+
+
+def get_grid_row(latitude):
+    return min(max(int((latitude + 90) / GRID_CELL_SIZE), 0), GRID_ROWS - 1)
+
+
+def get_grid_column(longitude):
+    return min(max(int((longitude + 180) / GRID_CELL_SIZE), 0), GRID_COLUMNS - 1)
+
+
+def get_grid_cell(latitude, longitude):
+    return get_grid_row(float(latitude)) * GRID_COLUMNS + get_grid_column(float(longitude))
+
+
+def get_grid_cell_ranges(min_latitude, min_longitude, max_latitude, max_longitude):
+    """
+    Get the grid cells covering a bounding box.  A box with min_longitude > max_longitude crosses the antimeridian.
+
+    :return: List of (first cell, last cell) ranges of consecutive cell numbers
+    """
+    if min_longitude <= max_longitude:
+        column_ranges = [(get_grid_column(min_longitude), get_grid_column(max_longitude))]
+    else:
+        column_ranges = [(get_grid_column(min_longitude), GRID_COLUMNS - 1), (0, get_grid_column(max_longitude))]
+
+    cell_ranges = []
+    for row in range(get_grid_row(min_latitude), get_grid_row(max_latitude) + 1):
+        for first_column, last_column in column_ranges:
+            cell_ranges.append((row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column))
+
+    return cell_ranges
+
+
+def get_bounding_box(latitude, longitude, radius):
+    """
+    Get a bounding box containing every point within radius km of a point.
+
+    :return: min_latitude, min_longitude, max_latitude, max_longitude
+    """
+    # Location coordinates are Decimals, which don't mix with floats
+    latitude, longitude, radius = float(latitude), float(longitude), float(radius)
+    latitude_delta = radius / KM_PER_DEGREE
+    min_latitude, max_latitude = latitude - latitude_delta, latitude + latitude_delta
+
+    if min_latitude <= -90 or max_latitude >= 90:
+        # The circle contains a pole, so it spans every longitude
+        return max(min_latitude, -90), -180, min(max_latitude, 90), 180
+
+    longitude_delta = math.degrees(math.asin(min(math.sin(radius / EARTH_RADIUS) / math.cos(math.radians(latitude)), 1)))
+    if longitude_delta >= 180:
+        return min_latitude, -180, max_latitude, 180
+
+    min_longitude, max_longitude = longitude - longitude_delta, longitude + longitude_delta
+    # Wrap around the antimeridian
+    if min_longitude < -180:
+        min_longitude += 360
+    if max_longitude > 180:
+        max_longitude -= 360
+
+    return min_latitude, min_longitude, max_latitude, max_longitude
+
+
+def get_distance(latitude1, longitude1, latitude2, longitude2):
+    """
+    Great-circle distance between two points in km (haversine formula).
+    """
+    latitude1, longitude1, latitude2, longitude2 = map(
+        math.radians, map(float, (latitude1, longitude1, latitude2, longitude2))
+    )
+    a = math.sin((latitude2 - latitude1) / 2) ** 2 + \
+        math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS * math.asin(min(math.sqrt(a), 1))
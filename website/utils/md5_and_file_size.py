@@ -1,37 +1,160 @@
 import hashlib
+import time
 
-DOWNLOAD_CHUNK_SIZE = 10240
+from django.conf import settings
 
+# Default number of bytes hashed per read, can be overridden with the MD5_CHUNK_SIZE setting.  Large reads keep the
+# number of Python level read()/update() calls low; 1 MiB is ~1000 calls per GB instead of ~100k with 10 KiB reads.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
 
-def get_md5_and_file_size(data_source, supposed_file_size=None, callback_function=None, *args):
-        bytes_processed = 0
-        md5 = hashlib.md5()
+# The progress callback fires when at least this many percent or milliseconds have passed since it last fired.  Can be
+# overridden with the MD5_CALLBACK_PERCENT_STEP and MD5_CALLBACK_INTERVAL settings.
+DEFAULT_CALLBACK_PERCENT_STEP = 5
+DEFAULT_CALLBACK_INTERVAL = 500
 
-        if supposed_file_size is None:
-            percent_processed = -1
 
-            if callback_function:
-                callback_function(percent_processed, *args)
+def get_chunk_size(chunk_size=None, supposed_file_size=None):
+    """
+    Get the number of bytes to read per chunk.
 
-        while True:
-            data = data_source.read(DOWNLOAD_CHUNK_SIZE)
+    :param chunk_size: Explicit chunk size, the MD5_CHUNK_SIZE setting (or DEFAULT_CHUNK_SIZE) is used if None
+    :param supposed_file_size: If known, small files get a buffer no bigger than the file
+    :rtype: int
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, "MD5_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+
+    if supposed_file_size is not None:
+        chunk_size = min(chunk_size, max(supposed_file_size, 1))
+
+    return chunk_size
 
-            # There was no more data to read
-            if not data:
-                break
 
-            bytes_processed += len(data)
+def get_md5_and_file_size(data_source, supposed_file_size=None, callback_function=None, *args, **kwargs):
+    """
+    Compute md5 and size of everything that can be read from data_source.
 
-            if supposed_file_size:
-                percent_processed = float(bytes_processed / supposed_file_size * 100)
+    If data_source supports readinto(), data is read into a single preallocated buffer, so no new string is allocated
+    per chunk.
 
-                if percent_processed > 10:
-                    if callback_function:
-                        callback_function(percent_processed, *args)
+    :param data_source: File-like object to read from
+    :param supposed_file_size: Expected size in bytes, used to compute the percentage passed to callback_function
+    :param callback_function: Called as callback_function(percent_processed, *args) to report progress.  Percentage is
+    -1 when supposed_file_size is unknown.
 
-            md5.update(data)
+    Keyword-only arguments (they come after *args, which are passed on to callback_function):
+    :param chunk_size: Number of bytes to read at a time, see get_chunk_size
+    :param callback_percent_step: Minimum progress in percent between two callbacks
+    :param callback_interval: Minimum time in milliseconds between two callbacks (callback fires if either passed)
+    :return: md5 hex digest and number of bytes read
+    :rtype: (str, int)
+    """
+    chunk_size = kwargs.pop("chunk_size", None)
+    callback_percent_step = kwargs.pop("callback_percent_step", None)
+    callback_interval = kwargs.pop("callback_interval", None)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments %s" % ", ".join(sorted(kwargs)))
+
+    bytes_processed = 0
+    md5 = hashlib.md5()
+    chunk_size = get_chunk_size(chunk_size, supposed_file_size)
+
+    if callback_percent_step is None:
+        callback_percent_step = getattr(settings, "MD5_CALLBACK_PERCENT_STEP", DEFAULT_CALLBACK_PERCENT_STEP)
+    if callback_interval is None:
+        callback_interval = getattr(settings, "MD5_CALLBACK_INTERVAL", DEFAULT_CALLBACK_INTERVAL)
+
+    if supposed_file_size is None:
+        percent_processed = -1
 
         if callback_function:
-            callback_function(100.0, *args)
+            callback_function(percent_processed, *args)
+
+    last_callback_percent = 0.0
+    last_callback_time = time.time()
+
+    if hasattr(data_source, "readinto"):
+        buffer_view = memoryview(bytearray(chunk_size))
+
+        def read_chunk():
+            bytes_read = data_source.readinto(buffer_view)
+            return buffer_view[:bytes_read or 0]
+    else:
+        def read_chunk():
+            return data_source.read(chunk_size)
+
+    while True:
+        data = read_chunk()
+
+        # There was no more data to read
+        if not len(data):
+            break
+
+        bytes_processed += len(data)
+        md5.update(data)
+
+        if callback_function and supposed_file_size:
+            percent_processed = float(bytes_processed) / supposed_file_size * 100
+            current_time = time.time()
+
+            if percent_processed - last_callback_percent >= callback_percent_step or \
+                    (current_time - last_callback_time) * 1000 >= callback_interval:
+                callback_function(percent_processed, *args)
+                last_callback_percent = percent_processed
+                last_callback_time = current_time
+
+    if callback_function:
+        callback_function(100.0, *args)
+
+    return md5.hexdigest(), bytes_processed
+
+
+class Md5AndFileSizeReader(object):
+    """
+    File-like wrapper that computes the md5 and size of everything read through it.  This lets data be hashed while it
+    is being streamed somewhere else (to storage for example) instead of being read a second time afterwards.
+
+    The data source can be a file-like object or an iterable of strings (a generator or an uploaded file's chunks()
+    for example).  At most one read's worth of data is buffered at a time.
+    """
+
+    def __init__(self, data_source):
+        if hasattr(data_source, "read"):
+            self._read = data_source.read
+        else:
+            self._chunks = iter(data_source)
+            self._buffer = b""
+            self._read = self._read_from_chunks
+
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def _read_from_chunks(self, size=-1):
+        buffered = [self._buffer]
+        buffered_size = len(self._buffer)
+
+        while size is None or size < 0 or buffered_size < size:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                break
+            buffered.append(chunk)
+            buffered_size += len(chunk)
+
+        data = b"".join(buffered)
+
+        if size is None or size < 0:
+            self._buffer = b""
+            return data
+
+        self._buffer = data[size:]
+        return data[:size]
+
+    def read(self, size=-1):
+        data = self._read(size)
+        self.md5.update(data)
+        self.size += len(data)
+        return data
 
-        return md5.hexdigest(), bytes_processed
\ No newline at end of file
+    def hexdigest(self):
+        return self.md5.hexdigest()
@@ -0,0 +1,63 @@
+"""
+Rolling per-request performance statistics, kept in process memory by website.middleware.PerformanceMiddleware.
+Every process keeps its own statistics, covering the last SAMPLE_COUNT requests of every URL name.
+"""
+import threading
+from collections import defaultdict, deque
+
+SAMPLE_COUNT = 1000
+PERCENTILES = (50, 90, 95, 99)
+# Measurements recorded for every request
+MEASUREMENTS = ("wall_time", "query_count", "query_time", "render_time", "response_size")
+
+
+def get_percentile(sorted_values, percentile):
+    return sorted_values[min(int(len(sorted_values) * percentile / 100.0), len(sorted_values) - 1)]
+
+
+class RequestStatistics(object):
+    def __init__(self, sample_count=SAMPLE_COUNT):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=sample_count))
+        self.request_counts = defaultdict(int)
+
+    def record(self, url_name, **measurements):
+        """
+        Record the measurements of one request (see MEASUREMENTS).  Times are in milliseconds, sizes in bytes.
+        """
+        sample = tuple(measurements.get(name) for name in MEASUREMENTS)
+        with self.lock:
+            self.samples[url_name].append(sample)
+            self.request_counts[url_name] += 1
+
+    def get_summary(self):
+        """
+        :return: Dictionary of URL name -> {"requests": total number of requests, "samples": number of recent
+                 requests the rest is computed from, measurement -> {"mean": ..., "max": ..., "p50": ..., ...}}
+        """
+        with self.lock:
+            samples = dict((url_name, list(url_samples)) for url_name, url_samples in self.samples.items())
+            request_counts = dict(self.request_counts)
+
+        summary = {}
+        for url_name, url_samples in samples.items():
+            url_summary = {"requests": request_counts[url_name], "samples": len(url_samples)}
+            for index, name in enumerate(MEASUREMENTS):
+                values = sorted(sample[index] for sample in url_samples if sample[index] is not None)
+                if not values:
+                    continue
+                url_summary[name] = dict(
+                    [("mean", sum(values) / float(len(values))), ("max", values[-1])] +
+                    [("p%s" % percentile, get_percentile(values, percentile)) for percentile in PERCENTILES]
+                )
+            summary[url_name] = url_summary
+
+        return summary
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.request_counts.clear()
+
+
+request_statistics = RequestStatistics()
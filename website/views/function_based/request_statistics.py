@@ -0,0 +1,18 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http.response import JsonResponse
+
+from website.utils.request_statistics import request_statistics
+
+
+@staff_member_required
+def view_request_statistics(request):
+    """
+    Rolling performance statistics per URL name recorded by website.middleware.PerformanceMiddleware in the process
+    serving this request, slowest 95th percentile first.
+    """
+    summary = request_statistics.get_summary()
+    url_names = sorted(summary, key=lambda url_name: summary[url_name]["wall_time"]["p95"], reverse=True)
+
+    return JsonResponse({"url_names": [dict(url_name=url_name, **summary[url_name]) for url_name in url_names]})
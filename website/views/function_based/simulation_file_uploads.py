@@ -0,0 +1,81 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+from django.contrib.auth.decorators import login_required
+from django.http.response import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from website.models import SimulationFileUpload
+
+
+def get_upload_status(upload):
+    return {
+        "id": upload.id,
+        "name": upload.name,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "received_chunks": upload.received_chunks,
+        "hashed_size": upload.hashed_size,
+        "simulation_file": upload.simulation_file_id,
+    }
+
+
+@login_required
+@require_POST
+def create_simulation_file_upload(request):
+    """
+    Start a chunked upload.  Expects the file's name and size in bytes.
+    """
+    try:
+        upload = SimulationFileUpload.objects.create_upload(
+            name=request.POST["name"],
+            size=int(request.POST["size"]),
+            uploaded_by=request.user,
+        )
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"error": "Invalid upload: %s" % e}, status=400)
+
+    return JsonResponse(get_upload_status(upload), status=201)
+
+
+@login_required
+@require_GET
+def simulation_file_upload_status(request, upload_id):
+    """
+    Status of a chunked upload.  Used by clients to find out which chunks still have to be sent after a disconnect.
+    """
+    upload = get_object_or_404(SimulationFileUpload, pk=upload_id, uploaded_by=request.user)
+    return JsonResponse(get_upload_status(upload))
+
+
+@login_required
+@require_http_methods(["PUT", "POST"])
+def upload_simulation_file_chunk(request, upload_id, index):
+    """
+    Receive one chunk of a chunked upload.  The request body is the chunk's raw contents.  Chunks can be sent in
+    parallel and in any order, and sending a chunk again just overwrites it.
+    """
+    upload = get_object_or_404(SimulationFileUpload, pk=upload_id, uploaded_by=request.user)
+
+    try:
+        upload.write_chunk(int(index), request.body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({"index": int(index), "hashed_size": upload.hashed_size})
+
+
+@login_required
+@require_POST
+def complete_simulation_file_upload(request, upload_id):
+    """
+    Finish a chunked upload once every chunk has been received and create the SimulationInputFile.
+    """
+    upload = get_object_or_404(SimulationFileUpload, pk=upload_id, uploaded_by=request.user)
+
+    try:
+        upload.complete(created_by=request.user)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(get_upload_status(upload))
@@ -0,0 +1,99 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+import mimetypes
+import os
+import re
+
+from django.contrib.auth.decorators import login_required
+from django.http.response import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from website.models import SimulationInputFile, SimulationOutputFile
+
+RANGE_REGEX = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_requested_range(range_header, size):
+    """
+    Parse the value of a Range header.  Only a single byte range is supported; for anything else the whole file is
+    served, which is what RFC 7233 allows servers to do.
+
+    :return: (offset, length) of the requested range, None to serve the whole file, or False if the range can't be
+    satisfied
+    """
+    match = RANGE_REGEX.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+        if first > last:
+            # Also covers a first byte past the end of the file
+            return False if first >= size else None
+    else:
+        # bytes=-N asks for the last N bytes
+        suffix_length = int(last)
+        if suffix_length == 0:
+            return False
+        first, last = max(size - suffix_length, 0), size - 1
+
+    return first, last - first + 1
+
+
+def etag_matches(header, etag):
+    return header.strip() == "*" or etag in [value.strip() for value in header.split(",")]
+
+
+@login_required
+@require_http_methods(["GET", "HEAD"])
+def download_simulation_file(request, file_type, file_id):
+    """
+    Stream a simulation file to the client.  Supports conditional GET on an ETag derived from the file's md5, so
+    clients re-fetching an unchanged file transfer nothing, and single byte range requests so interrupted downloads
+    can be resumed.
+    """
+    if file_type == "input":
+        queryset = SimulationInputFile.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(simulations__group__submitted_by=request.user).distinct()
+    else:
+        queryset = SimulationOutputFile.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(simulation__group__submitted_by=request.user)
+
+    simulation_file = get_object_or_404(queryset, pk=file_id)
+    etag = '"%s"' % simulation_file.md5
+
+    if etag_matches(request.META.get("HTTP_IF_NONE_MATCH", ""), etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    requested_range = None
+    # If-Range means "send the range only if the file is still the one I started downloading"
+    if "HTTP_RANGE" in request.META and request.META.get("HTTP_IF_RANGE", etag) == etag:
+        requested_range = get_requested_range(request.META["HTTP_RANGE"], simulation_file.size)
+
+    if requested_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */%s" % simulation_file.size
+        return response
+
+    if requested_range:
+        offset, length = requested_range
+        response = StreamingHttpResponse(simulation_file.iter_contents(offset=offset, length=length), status=206)
+        response["Content-Range"] = "bytes %s-%s/%s" % (offset, offset + length - 1, simulation_file.size)
+    else:
+        length = simulation_file.size
+        response = StreamingHttpResponse(simulation_file.iter_contents())
+
+    response["Content-Type"] = mimetypes.guess_type(simulation_file.name)[0] or "application/octet-stream"
+    response["Content-Length"] = length
+    response["Content-Disposition"] = 'attachment; filename="%s"' % os.path.basename(simulation_file.name)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+
+    return response
@@ -0,0 +1,66 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
+from django.http.response import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from website.models import SimulationGroup
+from website.utils.change_feed import simulation_group_changes
+
+# A stream ends with the first change, or after this many seconds without one (short enough for proxies not to close
+# the idle connection), and the browser reconnects.  Every open stream holds a worker while it waits, see
+# CHANGE_FEED_DIR in settings.py.
+LONG_POLL_TIMEOUT = 25
+# Milliseconds the browser waits before reconnecting
+RECONNECT_DELAY = 1000
+# Event id of the progress of groups whose counts never changed since the change feed was created (they have no
+# version), so the browser doesn't get the same progress again every time it reconnects
+NO_VERSION = "none"
+
+
+def get_progress_event(group, version):
+    status_counts = group.get_status_counts()
+    return "id: %s\nevent: progress\ndata: %s\n\n" % (version or NO_VERSION, json.dumps({
+        "status_counts": status_counts,
+        "total": sum(status_counts.values()),
+    }))
+
+
+def stream_progress(group, last_version):
+    """
+    Yield a progress event as soon as the status counts of group differ from last_version, then end the stream; end
+    it without an event if nothing changes within LONG_POLL_TIMEOUT.  Nothing touches the database until a change.
+    """
+    yield "retry: %s\n\n" % RECONNECT_DELAY
+
+    version = simulation_group_changes.wait(group.id, last_version, LONG_POLL_TIMEOUT)
+    if version != last_version:
+        yield get_progress_event(group, version)
+
+
+@login_required
+def simulation_group_progress_stream(request, group_id):
+    """
+    Push the progress of a simulation group to the browser as server-sent events, long-polling style: every stream
+    delivers at most one change and the browser's EventSource reconnects for the next.
+    A reconnecting browser sends the id of the last event it received (Last-Event-ID header), so it only gets an event
+    if something changed since then.  Browsers without any event get the current progress right away.
+    """
+    group = get_object_or_404(SimulationGroup, id=group_id)
+    if group.submitted_by_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({"error": "Not authorized"}, status=403)
+
+    # Browsers without any event get an empty version, which differs from every version (None included), so they get
+    # the current progress right away
+    last_version = request.META.get("HTTP_LAST_EVENT_ID", "")
+    if last_version == NO_VERSION:
+        last_version = None
+
+    response = StreamingHttpResponse(stream_progress(group, last_version), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,93 @@
+# Copyright (C) 2015, University of Notre Dame
+# All rights reserved
+import json
+
+from django.conf import settings
+from django.http.response import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import six, timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from vecnet.simulation import sim_status
+
+from website.models import STATUS_UPDATE_FIELDS, Simulation
+
+
+def parse_status_update(line):
+    """
+    Parse one line of a status update batch, for example:
+    {"id": 12, "status": "model", "execution_start_timestamp": "2016-01-18T10:01:02Z"}
+    Timestamps without a time zone are taken to be in UTC.
+
+    :raise ValueError: If the line is not a valid update
+    """
+    update = json.loads(line)
+    if not isinstance(update, dict) or "id" not in update:
+        raise ValueError("Expected an object with an id")
+
+    # Everything is checked here, anything that gets through has to be safe to write to the database
+    simulation_id = update["id"]
+    if isinstance(simulation_id, bool) or not isinstance(simulation_id, six.integer_types + six.string_types):
+        raise ValueError("Invalid id")
+    try:
+        update["id"] = int(simulation_id)
+    except ValueError:
+        raise ValueError("Invalid id")
+
+    if "status" in update and not sim_status.is_valid(update["status"]):
+        raise ValueError("Invalid status")
+
+    for field_name in ("execution_start_timestamp", "execution_end_timestamp"):
+        if update.get(field_name) is not None:
+            if not isinstance(update[field_name], six.string_types):
+                raise ValueError("Invalid %s" % field_name)
+            timestamp = parse_datetime(update[field_name])
+            if timestamp is None:
+                raise ValueError("Invalid %s" % field_name)
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp, timezone.utc)
+            update[field_name] = timestamp
+
+    return dict((key, value) for key, value in update.items() if key == "id" or key in STATUS_UPDATE_FIELDS)
+
+
+def is_authorized(request):
+    """
+    The cluster authenticates with the token from the SIMULATION_STATUS_TOKEN setting.  Without a token, staff can
+    post updates with their session, which has to pass the CSRF check like any other form.
+    """
+    token = getattr(settings, "SIMULATION_STATUS_TOKEN", None)
+    if token:
+        return constant_time_compare(request.META.get("HTTP_AUTHORIZATION", ""), "Token %s" % token)
+
+    if not (request.user.is_authenticated() and request.user.is_staff):
+        return False
+    # process_view returns a response only when the request fails the check
+    return CsrfViewMiddleware().process_view(request, None, (), {}) is None
+
+
+@csrf_exempt  # Token requests come from the cluster, not a browser; is_authorized checks CSRF for session requests
+@require_POST
+def ingest_simulation_status_updates(request):
+    """
+    Receive a batch of simulation status updates from the cluster as JSON lines (one update per line).  Updates for
+    the same simulation are coalesced and the whole batch is applied with a few bulk UPDATEs.
+    """
+    if not is_authorized(request):
+        return JsonResponse({"error": "Not authorized"}, status=403)
+
+    updates = []
+    # Iterating over the request reads the body line by line
+    for line_number, line in enumerate(request, 1):
+        if not line.strip():
+            continue
+        try:
+            updates.append(parse_status_update(line.decode("utf-8")))
+        except ValueError as e:
+            return JsonResponse({"error": "Line %s: %s" % (line_number, e)}, status=400)
+
+    updated_count = Simulation.objects.apply_status_updates(updates)
+
+    return JsonResponse({"received": len(updates), "updated": updated_count})